@@ -1,32 +1,195 @@
 """
 Data Analysis and Visualisation Module
 
-This module performs the cleaning of the collected datasets
-and then stores the cleaned data in SQL database tables.
-
-We use Python Pandas package to import the data and then transform
-it to the desired format. MySQL Connector Python package is used to
-connect to a MySQL database server and store the cleaned data 
+This module analyses the data stored by the Data Pre-processing
+module: the Olympic medals of the countries across the Games, their
+GDP and the covid cases, deaths and vaccinations around the Tokyo
+Olympics 2020.
+
+The data is only read, with SQL queries run through the storage
+interface of the dmp_storage module (a MySQL database server or an
+embedded SQLite/DuckDB database), and loaded into Pandas DataFrames.
+The charts are drawn with Matplotlib and written to image files, and
+a report of all the countries can be generated as HTML or Markdown.
 """
 
 author = "Tanuja Seervi, Bikiran Choudhury"
 
 
-import mysql.connector
+import re
+import numpy as np
 import pandas as pd
+from html import escape
 import matplotlib.pyplot as plt
 
-from getpass import getpass
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs, path
+from dmp_profiling import PROFILER, profiled
+from dmp_storage import connect_storage_pool
+
+
+# Olympic Games editions (games_id of the 'olympic_medals' table) compared in the analysis
+OLYMPIC_GAMES = ["tokyo_olympic_2020", "rio_olympic_2016", "london_olympic_2012"]
+
+# The covid and vaccination metrics plotted as trends
+TREND_METRICS = ["cumulative_cases", "new_cases", "cumulative_deaths", "new_deaths",
+                 "people_vaccinated", "people_fully_vaccinated"]
+
+# Time bucket of the trends: "day", "week" or "month" (aggregated in SQL,
+# the last value of the cumulative metrics and the sum of the 'new_' metrics)
+TREND_RESOLUTION = "day"
+
+# Medal count columns of the 'olympic_medals' table
+MEDAL_TYPES = ["gold_medals", "silver_medals", "bronze_medals", "total_medals"]
+
+# MedalDeviations by (target games, baseline games, data version)
+MEDAL_DEVIATION_CACHE = {}
+
+# Columns of the 'gdp_value' table
+GDP_YEARS = ["gdp_2012", "gdp_2013", "gdp_2014", "gdp_2015", "gdp_2016", "gdp_2017", "gdp_2018",
+             "gdp_2019", "gdp_2020", "gdp_2021"]
+
+# Directory of the all-countries report ("report mode" of main(), None: disabled)
+# and its format: "html" or "markdown"
+REPORT_DIR = None
+REPORT_FORMAT = "html"
+
+# Directory where the charts are written (headless mode, Agg backend).
+# None shows every chart interactively with plt.show().
+RENDER_DIR = None
+
+# File formats of the written charts
+RENDER_FORMATS = ["png", "svg"]
+
+# Number of processes rendering the charts in headless mode (None: one per CPU)
+MAX_RENDER_WORKERS = None
+
+
+def chart_file_name(*parts):
+    """
+    This function returns the file name (without extension) of a chart,
+    made of the given parts with only the safe characters kept.
+    """
+
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", "_".join(str(part) for part in parts)).strip("-")
+
+
+def draw_chart(file_name, plot_func, *args, render_dir=None, formats=None):
+    """
+    This function draws a chart with plot_func(*args) on a new figure and
+    shows it, or writes it into 'render_dir' in all the given formats.
+
+    Input:
+        file_name: string
+            see chart_file_name()
+        plot_func: function
+            draws on the current figure from prepared DataFrames
+        args:
+            arguments of plot_func
+        render_dir: string
+            directory of the chart files, None shows the chart
+        formats: list[strings]
+            default RENDER_FORMATS
+
+    Return:
+        list[strings]: paths of the written files
+    """
+
+    if render_dir is not None:
+        plt.switch_backend("Agg")
+
+    plt.figure()
+    plot_func(*args)
+
+    if render_dir is None:
+        plt.show()
+        return []
+
+    file_paths = [path.join(render_dir, "{}.{}".format(file_name, fmt)) for fmt in formats or RENDER_FORMATS]
+
+    for file_path in file_paths:
+        plt.savefig(file_path, bbox_inches="tight")
+    plt.close("all")
+
+    return file_paths
+
+
+def render_chart(executor, file_name, plot_func, *args, render_dir=None):
+    """
+    This function draws a chart (see draw_chart()) in this process, or
+    submits it to the process pool 'executor' of the headless mode.
+
+    Input:
+        executor: ProcessPoolExecutor or None
+        file_name: string
+        plot_func: function
+        args:
+            arguments of plot_func, prepared DataFrames and labels
+        render_dir: string
+            directory of the chart files, default RENDER_DIR
+
+    Return:
+        Future or list[strings]
+    """
+
+    render_dir = RENDER_DIR if render_dir is None else render_dir
+
+    if render_dir is None:
+        return draw_chart(file_name, plot_func, *args)
+
+    if executor is None:
+        return draw_chart(file_name, plot_func, *args, render_dir=render_dir, formats=RENDER_FORMATS)
+
+    return executor.submit(draw_chart, file_name, plot_func, *args,
+                           render_dir=render_dir, formats=RENDER_FORMATS)
+
+
+def get_country_ids(storage, country_names):
+    """
+    This function returns the ids of the given country names
+    in the 'country' dimension table.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        country_names: list[strings]
+            names of the countries
+
+    Return:
+        dict: {country_name: country_id} of the known countries
+    """
+
+    select_ids_query = "SELECT country_name, country_id FROM country WHERE country_name IN ({})".\
+                        format(",".join(["%s"] * len(country_names)))
+    return dict(storage.query(select_ids_query, tuple(country_names)))
+
+
+def get_country_names(storage):
+    """
+    This function returns the names of all the countries
+    of the 'country' dimension table.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+    Return:
+        dict: {country_id: country_name}
+    """
+
+    return dict(storage.query("SELECT country_id, country_name FROM country"))
 
 
-def get_all_country_performance(cursor, olympic_names, medals):
+@profiled
+def get_all_country_performance(storage, olympic_names, medals):
     """
     This function returns a dataframe containing country name
     and medals count for each of the given olympic names.
 
     Input:
-        cursor: MySQLCursor
-            cursor object to interact with the MySQL database server
+        storage: StorageBackend
+            connection to the database with the stored tables
         
         olympic_names: list
             List of Olympic games for which we want the medal counts
@@ -40,27 +203,322 @@ def get_all_country_performance(cursor, olympic_names, medals):
         df_final: Pandas DataFrame
     """
     
-    # dummy empty dataframe
-    df_final = pd.DataFrame()
-    
-    for olympic in olympic_names:
-        select_medals_query = "SELECT country_name, {} FROM {}".format(medals,olympic)
-        cursor.execute(select_medals_query)
-        output_records = cursor.fetchall()
-        df_tmp = pd.DataFrame(output_records, columns = ["Country_Name", olympic])
-        
-        if len(df_final):
-            df_final = pd.merge(df_final, df_tmp,\
-                            left_on="Country_Name",right_on="Country_Name", how="inner")
-        else:
-            df_final = df_tmp
-            
-    df_final = df_final.set_index("Country_Name")
+    # medal counts of all the given olympics at once
+    select_medals_query = "SELECT c.country_name, m.games_id, m.{} FROM olympic_medals m \
+                            JOIN country c ON c.country_id = m.country_id \
+                            WHERE m.games_id IN ({})".\
+                            format(medals, ",".join(["%s"] * len(olympic_names)))
+    output_records = storage.query(select_medals_query, tuple(olympic_names))
+    df_tmp = pd.DataFrame(output_records, columns=["Country_Name", "Games_Id", medals])
+
+    # One column per olympic, only the countries with medals in all of them
+    df_final = df_tmp.pivot(index="Country_Name", columns="Games_Id", values=medals).\
+        reindex(columns=olympic_names).dropna().astype("int64")
+    df_final.columns.name = None
     
     return df_final
 
 
-def get_covid_death_vac_rate(cursor, country_name, year_span, covid_vac_col_name):
+@profiled
+def get_medal_counts(storage, olympic_names):
+    """
+    This function returns all the medal counts of all the countries
+    in the given olympics, fetched with a single query. A country
+    without a record in an olympic won no medals in it.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        olympic_names: list
+            List of Olympic games for which we want the medal counts
+
+    Return:
+        numpy array: medal counts, shape (countries, olympics, MEDAL_TYPES)
+        list[strings]: country names of the first axis
+    """
+
+    select_medals_query = "SELECT c.country_name, m.games_id, {} FROM olympic_medals m \
+                            JOIN country c ON c.country_id = m.country_id \
+                            WHERE m.games_id IN ({})".\
+                            format(", ".join("m." + col for col in MEDAL_TYPES),
+                                   ",".join(["%s"] * len(olympic_names)))
+    df_tmp = pd.DataFrame(storage.query(select_medals_query, tuple(olympic_names)),
+                          columns=["Country_Name", "Games_Id"] + MEDAL_TYPES)
+
+    # Scatter the records into the (country, olympic, medal) array
+    country_codes, country_names = pd.factorize(df_tmp["Country_Name"], sort=True)
+    games_codes = pd.Index(olympic_names).get_indexer(df_tmp["Games_Id"])
+
+    counts = np.zeros((len(country_names), len(olympic_names), len(MEDAL_TYPES)))
+    counts[country_codes, games_codes] = df_tmp[MEDAL_TYPES].to_numpy(dtype="float64")
+
+    return counts, list(country_names)
+
+
+class MedalDeviations:
+    """
+    Deviation of the medal counts of all the countries in a target
+    olympic from their counts in the baseline olympics, for every
+    medal type, computed with a fixed number of NumPy passes:
+
+        target, baseline_mean, baseline_var: counts
+        deviation: target - baseline_mean
+        relative_deviation: deviation / baseline_mean
+        z_score: deviation / baseline standard deviation of the country
+        deviation_z: deviation standardized over all the countries
+        target_rank, baseline_rank: ranks by medal count (1 = most)
+        rank_shift: baseline_rank - target_rank (positive = improved)
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+        target_games: string
+            default OLYMPIC_GAMES[0]
+        baseline_games: list[strings]
+            default the other OLYMPIC_GAMES
+    """
+
+    STATS = ["target", "baseline_mean", "baseline_var", "deviation", "relative_deviation",
+             "z_score", "deviation_z", "target_rank", "baseline_rank", "rank_shift"]
+
+    def __init__(self, storage, target_games=None, baseline_games=None):
+        self.target_games = target_games or OLYMPIC_GAMES[0]
+        self.baseline_games = list(baseline_games or [g for g in OLYMPIC_GAMES if g != self.target_games])
+
+        counts, self.country_names = get_medal_counts(storage, [self.target_games] + self.baseline_games)
+        self.table = self.compute(counts, self.country_names)
+
+    @classmethod
+    def compute(cls, counts, country_names):
+        """
+        Return the statistics of the counts (countries, olympics, medals),
+        the first olympic being the target, indexed by (medal, country).
+        """
+
+        target = counts[:, 0, :]
+        baseline = counts[:, 1:, :]
+
+        # Baseline mean and variance of every country and medal type
+        baseline_mean = baseline.mean(axis=1)
+        baseline_var = baseline.var(axis=1, ddof=1 if baseline.shape[1] > 1 else 0)
+        baseline_std = np.sqrt(baseline_var)
+
+        # Absolute, relative and standardized deviations (NaN where undefined)
+        deviation = target - baseline_mean
+        relative_deviation = np.divide(deviation, baseline_mean, out=np.full_like(deviation, np.nan),
+                                       where=baseline_mean > 0)
+        z_score = np.divide(deviation, baseline_std, out=np.full_like(deviation, np.nan),
+                            where=baseline_std > 0)
+
+        deviation_std = deviation.std(axis=0)
+        deviation_z = np.divide(deviation - deviation.mean(axis=0), deviation_std,
+                                out=np.zeros_like(deviation), where=deviation_std > 0)
+
+        # Competition ranks (1 = most medals) of every olympic and medal type:
+        # 1 + number of countries with more medals, from the sorted counts
+        sorted_counts = np.sort(counts, axis=0)
+        ranks = np.empty_like(counts)
+
+        for games in range(counts.shape[1]):
+            for medal in range(counts.shape[2]):
+                ranks[:, games, medal] = 1 + len(counts) - np.searchsorted(
+                    sorted_counts[:, games, medal], counts[:, games, medal], side="right")
+
+        target_rank = ranks[:, 0, :]
+        baseline_rank = ranks[:, 1:, :].mean(axis=1)
+
+        stats = [target, baseline_mean, baseline_var, deviation, relative_deviation,
+                 z_score, deviation_z, target_rank, baseline_rank, baseline_rank - target_rank]
+
+        # One row per (medal, country): stack the (countries, medals) arrays medal-major
+        index = pd.MultiIndex.from_product([MEDAL_TYPES, country_names], names=["Medal", "Country_Name"])
+
+        return pd.DataFrame({name: stat.T.ravel() for name, stat in zip(cls.STATS, stats)}, index=index)
+
+    def medal(self, medal="total_medals"):
+        """
+        Return the statistics of all the countries for one medal type.
+        """
+
+        return self.table.loc[medal]
+
+    def top_decliners(self, medal="total_medals", n=10, by="deviation"):
+        """
+        Return the 'n' countries with the lowest 'by' statistic.
+        """
+
+        return self.medal(medal).nsmallest(n, by)
+
+    def top_risers(self, medal="total_medals", n=10, by="deviation"):
+        """
+        Return the 'n' countries with the highest 'by' statistic.
+        """
+
+        return self.medal(medal).nlargest(n, by)
+
+    def filter(self, medal=None, countries=None, min_baseline=None, condition=None):
+        """
+        Return the statistics of the given medal type and countries, with a
+        baseline mean of at least 'min_baseline', matching the 'condition'
+        expression (DataFrame.query, e.g. "z_score < -2").
+        """
+
+        df = self.table
+
+        if medal is not None:
+            df = df.xs(medal, level="Medal", drop_level=False)
+        if countries is not None:
+            df = df[df.index.get_level_values("Country_Name").isin(countries)]
+        if min_baseline is not None:
+            df = df[df["baseline_mean"] >= min_baseline]
+        if condition is not None:
+            df = df.query(condition)
+
+        return df
+
+
+@profiled
+def get_medal_deviations(storage, target_games=None, baseline_games=None):
+    """
+    This function returns the MedalDeviations of the given olympics,
+    cached until the data version of the database changes.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+        target_games: string
+        baseline_games: list[strings]
+            see MedalDeviations
+
+    Return:
+        MedalDeviations
+    """
+
+    key = (target_games, tuple(baseline_games or ()), storage.data_version())
+
+    if key not in MEDAL_DEVIATION_CACHE:
+        MEDAL_DEVIATION_CACHE[key] = MedalDeviations(storage, target_games, baseline_games)
+
+    return MEDAL_DEVIATION_CACHE[key]
+
+
+@profiled
+def get_covid_death_vac_metrics(storage, country_names, year_spans, covid_vac_col_names, resolution=None):
+    """
+    This function returns a dataframe which contains the per population rate
+    of all the given metrics 'covid_vac_col_names' for all the given countries
+    and time durations, fetched with a single query.
+
+    The rates are computed at ingest time (table 'covid_per_capita')
+    with the population of the reported year.
+
+    With a "week" or "month" 'resolution', the rows are aggregated by the
+    database into one row per bucket (dated by its first day): the last
+    value of the cumulative metrics and the sum of the 'new_' metrics.
+
+    The metrics can be any of the below:
+    'cumulative_cases', 'new_cases', 'cumulative_deaths', 'new_deaths',
+    'people_vaccinated', 'people_fully_vaccinated'
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        country_names: list[strings]
+            list of country names for which we want the results
+
+        year_spans: list[list]
+            the time durations for which we want the values
+
+        covid_vac_col_names: list[strings]
+            the metrics for which we want per population rate
+
+        resolution: string
+            "day", "week" or "month", default TREND_RESOLUTION
+
+    Return:
+        Pandas DataFrame: indexed by 'Reported_Date', with (metric, country) columns
+    """
+
+    resolution = resolution or TREND_RESOLUTION
+    country_names = list(dict.fromkeys(country_names))
+    covid_vac_col_names = list(dict.fromkeys(covid_vac_col_names))
+    span_condition = " OR ".join(["date_reported BETWEEN %s AND %s"] * len(year_spans))
+    span_params = [date for year_span in year_spans for date in year_span]
+
+    # ids of the mentioned country names (-1 matches no rows)
+    country_ids = get_country_ids(storage, country_names)
+    id_params = list(country_ids.values()) or [-1]
+
+    # fetch the precomputed rates of all the countries and durations (index range scans)
+    select_rates_query = "SELECT country_id, date_reported, {} FROM covid_per_capita \
+                WHERE country_id IN ({}) AND ({})".\
+                format(", ".join(covid_vac_col_names), ",".join(["%s"] * len(id_params)), span_condition)
+
+    if resolution != "day":
+        # Bucket the rows in the database: sums of the 'new_' metrics and
+        # the last reported date of every bucket, joined back to read the
+        # last value of the cumulative metrics
+        bucket = storage.date_bucket("date_reported", resolution)
+        select_rates_query = "SELECT b.country_id, b.bucket, {} FROM ( \
+                    SELECT country_id, {} AS bucket, MAX(date_reported) AS last_date{} \
+                    FROM covid_per_capita WHERE country_id IN ({}) AND ({}) \
+                    GROUP BY country_id, {}) b \
+                JOIN covid_per_capita v ON v.country_id = b.country_id AND v.date_reported = b.last_date".\
+                format(", ".join(("b." if col.startswith("new_") else "v.") + col for col in covid_vac_col_names),
+                       bucket, "".join(", SUM({0}) AS {0}".format(col) for col in covid_vac_col_names
+                                       if col.startswith("new_")),
+                       ",".join(["%s"] * len(id_params)), span_condition, bucket)
+
+    output_records = storage.query(select_rates_query, id_params + span_params)
+
+    df_tmp = pd.DataFrame(data=output_records, columns=["Country_Id", "Reported_Date"] + covid_vac_col_names)
+    df_tmp["Reported_Date"] = pd.to_datetime(df_tmp["Reported_Date"])
+    df_tmp["Country_Name"] = df_tmp["Country_Id"].map({i: name for name, i in country_ids.items()})
+
+    # overlapping durations return the same rows
+    df_rates = df_tmp.drop_duplicates(["Country_Id", "Reported_Date"]).\
+        set_index(["Reported_Date", "Country_Name"])[covid_vac_col_names].astype("float64")
+
+    # One column per (metric, country)
+    df_final = df_rates.unstack("Country_Name").reindex(
+        columns=pd.MultiIndex.from_product([covid_vac_col_names, country_names])).sort_index()
+
+    return df_final
+
+
+def get_covid_death_vac_rates(storage, country_names, year_spans, covid_vac_col_name, resolution=None):
+    """
+    This function returns a dataframe which contains the per population rate
+    of given a parameter: 'covid_vac_col_name' for all the given countries
+    and time durations.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        country_names: list[strings]
+            list of country names for which we want the results
+
+        year_spans: list[list]
+            the time durations for which we want the values
+
+        covid_vac_col_name: string
+            the metric for which we want per population rate
+
+        resolution: string
+            "day", "week" or "month", default TREND_RESOLUTION
+
+    Return:
+        Pandas DataFrame: indexed by 'Reported_Date', one column per country
+    """
+
+    return get_covid_death_vac_metrics(storage, country_names, year_spans, [covid_vac_col_name],
+                                       resolution)[covid_vac_col_name]
+
+
+def get_covid_death_vac_rate(storage, country_name, year_span, covid_vac_col_name):
     """
     This function returns a dataframe which contains the per population rate
     of given a parameter: 'covid_vac_col_name' for reported_date
@@ -70,13 +528,13 @@ def get_covid_death_vac_rate(cursor, country_name, year_span, covid_vac_col_name
     'people_vaccinated', 'people_fully_vaccinated'
 
     Input:
-        cursor: MySQLCursor
-            cursor object to interact with the MySQL database server
+        storage: StorageBackend
+            connection to the database with the stored tables
         
-        country_name: list[strings]
-            list of country names for which we want the results
+        country_name: string
+            name of the country for which we want the results
 
-        year_span: list[list]
+        year_span: list
             the time duration for which we want the values
         
         covid_vac_col_name: string
@@ -86,49 +544,118 @@ def get_covid_death_vac_rate(cursor, country_name, year_span, covid_vac_col_name
         Pandas DataFrame
     """
     
-    # for population column
-    pop_col_name = 'pop_'+year_span[0][0:4]
-
-    # fetch population for given year
-    select_population_query = "SELECT country_name, {} FROM population \
-                                WHERE country_name = '{}'".format(pop_col_name,country_name)
-    cursor.execute(select_population_query)
-    
-    population = cursor.fetchall()
-    df_pop = pd.DataFrame(population, columns=["Country_Name", pop_col_name])
-    
-        
-    # fetch desired metric for given year
-    select_col_query = "SELECT country_name, date_reported, {} FROM covid_and_vac \
-                WHERE country_name = '{}' and date(date_reported) BETWEEN '{}' AND '{}'".\
-                format(covid_vac_col_name, country_name, year_span[0], year_span[1])
-    cursor.execute(select_col_query)
-    
-    output_records = cursor.fetchall()
-    df_cum_cases = pd.DataFrame(data=output_records, \
-                        columns=["Country_Name", "Reported_Date", covid_vac_col_name])
-        
-    # Calculate per population rate of desired metric for given year
-    df_tmp = pd.merge(df_cum_cases, df_pop[["Country_Name",pop_col_name]], \
-                    left_on="Country_Name", right_on="Country_Name", how="inner")
-        
+    df_tmp = get_covid_death_vac_rates(storage, [country_name], [year_span], covid_vac_col_name)
     
-    # Calculate the per population rate
-    df_tmp["Rate"] = df_tmp[covid_vac_col_name]/df_tmp[pop_col_name]
-    df_tmp = df_tmp.rename(columns={"Rate": country_name})
-        
-    
-    return df_tmp[["Reported_Date",country_name]] 
+    return df_tmp.reset_index()[["Reported_Date",country_name]] 
+
+
+def plot_covid_death_vac_trend(df_final, covid_vac_col_name):
+    """
+    This function plots the trends over the
+    reported date for the given metric.
+
+    Input:
+        df_final: Pandas DataFrame
+            rates indexed by 'Reported_Date', one column per country
+
+        covid_vac_col_name: string
+            the metric for which we want the trend
+
+    Return: None
+    """
+
+    # plot the graph
+    df_final.plot(logy=True, ax=plt.gca())
+
+    plt.title("{} per Population Trend".format(covid_vac_col_name.capitalize()))
+    plt.legend(loc='upper left')
+    plt.xlabel("Reported_Date")
+    plt.ylabel("{} per Population".format(covid_vac_col_name.capitalize()))
+    plt.grid(color="gray")
+
+    return None
+
+
+def covid_death_vac_trend_plots(storage, country_names, years, covid_vac_col_names, executor=None,
+                                resolution=None):
+    """
+    This function shows(plots) the trends over the reported date
+    for every given metric, from a single fetch of all the metrics.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
 
+        country_names: list[strings]
+            list of country names for which we want the results
+
+        years: list[list]
+            the time durations for which we want the values
+
+        covid_vac_col_names: list[strings]
+            the metrics for which we want the trends
+
+        executor: ProcessPoolExecutor
+            render the charts headless on this pool, see render_chart()
+
+        resolution: string
+            "day", "week" or "month", default TREND_RESOLUTION
+
+    Return:
+        list: the rendered charts, see render_chart()
+    """
+
+    # Fetch the rates of all the metrics, countries and durations at once
+    df_metrics = get_covid_death_vac_metrics(storage, country_names, years, covid_vac_col_names, resolution)
+
+    return render_covid_death_vac_trends(df_metrics, country_names, covid_vac_col_names, executor)
+
+
+def render_covid_death_vac_trends(df_metrics, country_names, covid_vac_col_names, executor=None):
+    """
+    This function shows(plots) the trend of every given metric from
+    the fetched rates (see get_covid_death_vac_metrics()).
+
+    Input:
+        df_metrics: Pandas DataFrame
+            rates with (metric, country) columns
+
+        country_names: list[strings]
+            countries of the rates
+
+        covid_vac_col_names: list[strings]
+            the metrics for which we want the trends
+
+        executor: ProcessPoolExecutor
+            render the charts headless on this pool, see render_chart()
+
+    Return:
+        list: the rendered charts, see render_chart()
+    """
 
-def covid_death_vac_trend_plot(cursor, country_names, years, covid_vac_col_name):
+    charts = []
+
+    for covid_vac_col_name in covid_vac_col_names:
+        df_final = df_metrics[covid_vac_col_name]
+
+        if df_final.notna().any(axis=None):
+            charts.append(render_chart(executor, chart_file_name("trend", covid_vac_col_name, *country_names),
+                                       plot_covid_death_vac_trend, df_final, covid_vac_col_name))
+        else:
+            print("Data is not available for selected Country")
+
+    return charts
+
+
+def covid_death_vac_trend_plot(storage, country_names, years, covid_vac_col_name, executor=None,
+                               resolution=None):
     """
     This function shows(plots) the trends over the
     reported date for the given metric.
 
     Input:
-        cursor: MySQLCursor
-            cursor object to interact with the MySQL database server
+        storage: StorageBackend
+            connection to the database with the stored tables
         
         country_name:list[strings]
             list of country names for which we want the results
@@ -138,79 +665,91 @@ def covid_death_vac_trend_plot(cursor, country_names, years, covid_vac_col_name)
 
         covid_vac_col_name: string
             the metric for which we want the trend
+
+        executor: ProcessPoolExecutor
+            render the chart headless on this pool, see render_chart()
+
+        resolution: string
+            "day", "week" or "month", default TREND_RESOLUTION
     
-    Return: None
+    Return:
+        list: the rendered charts, see render_chart()
     """
     
-    # dummy empty dataframe
-    df_final = pd.DataFrame()
+    return covid_death_vac_trend_plots(storage, country_names, years, [covid_vac_col_name], executor,
+                                       resolution)
 
-    
-    # Iterate over the country names and plot
-    for name in country_names:
-        
-        df_years = pd.DataFrame()
-        
-        for year_span in years:
-            df_tmp = get_covid_death_vac_rate(cursor, name, year_span, covid_vac_col_name)
-            df_years = pd.concat([df_years,df_tmp], axis=0)
-        
-        if len(df_final):
-            df_final = pd.merge(df_final,df_years,left_on="Reported_Date", \
-                                right_on="Reported_Date", how="outer")
-        else:
-            df_final = df_years
-    
-    # set 'Reported_Date' as the index of the dataframe
-    df_final = df_final.set_index("Reported_Date")
 
-    
-    if len(df_final):
-        # plot the graph
-        df_final.plot(logy=True)
-
-        plt.title("{} per Population Trend".format(covid_vac_col_name.capitalize()))
-        plt.legend(loc='upper left')
-        plt.xlabel("Reported_Date")
-        plt.ylabel("{} per Population".format(covid_vac_col_name.capitalize()))
-        plt.grid(color="gray")
-        plt.show()
-    else:
-        print("Data is not available for selected Country")
-    
+def plot_country_gdp(df_final):
+    """
+    This function plots the GDP trend of the countries
+    (rows of 'df_final') over the gdp years (columns).
+    """
+
+    df_final.transpose().plot(marker='o', ax=plt.gca())
+
+    plt.title("GDP")
+    plt.legend(loc='upper left')
+    plt.xlabel("Year")
+    plt.ylabel("GDP Value (in Billions of U.S. dollars)")
+    plt.grid(color="gray")
+
     return None
 
 
-def get_country_gdp(cursor, country_names):
+def get_country_gdp(storage, country_names, executor=None):
     """
     This fuction plots the GDP trend for given
     country_name(s) over a span of years
 
     Input:
-        cursor: MySQLCursor
-            cursor object to interact with the MySQL database server
+        storage: StorageBackend
+            connection to the database with the stored tables
         
         country_name: tuple(strings)
             name of the countries
 
-    Return: None
+        executor: ProcessPoolExecutor
+            render the chart headless on this pool, see render_chart()
+
+    Return:
+        list: the rendered charts, see render_chart()
+    """
+
+    df_final = fetch_country_gdp(storage, country_names)
+
+    return render_country_gdp(df_final, country_names, executor)
+
+
+@profiled
+def fetch_country_gdp(storage, country_names):
+    """
+    This function returns the GDP values (columns) of the
+    given country names (rows).
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        country_names: tuple(strings)
+            name of the countries
+
+    Return:
+        Pandas DataFrame
     """
     
     # available values of gdp year
-    years = ["gdp_2012","gdp_2013","gdp_2014","gdp_2015","gdp_2016","gdp_2017","gdp_2018",\
-        "gdp_2019","gdp_2020","gdp_2021"]
+    years = GDP_YEARS
     
+    # ids of the mentioned country names (-1 matches no rows)
+    country_ids = list(get_country_ids(storage, country_names).values()) or [-1]
+
     # get the gdp values for the mentioned country name
-    if len(country_names) > 1:
-        select_gdp_query = "SELECT * FROM gdp_value WHERE country_name IN {}".\
-                            format(country_names)
-        cursor.execute(select_gdp_query)
-        gdp = cursor.fetchall()
-    
-    else:
-        select_gdp_query = "SELECT * FROM gdp_value WHERE country_name = '{}'".format(country_names[0])
-        cursor.execute(select_gdp_query)
-        gdp = cursor.fetchall()
+    select_gdp_query = "SELECT c.country_name, {} FROM gdp_value g \
+                        JOIN country c ON c.country_id = g.country_id \
+                        WHERE g.country_id IN ({})".\
+                        format(", ".join(years), ",".join(["%s"] * len(country_ids)))
+    gdp = storage.query(select_gdp_query, country_ids)
         
      
     data_list = []
@@ -222,21 +761,51 @@ def get_country_gdp(cursor, country_names):
 
     df_final = pd.DataFrame(data=data_list, index=index_names, columns=years)
 
+    return df_final
+
+
+def render_country_gdp(df_final, country_names, executor=None):
+    """
+    This function shows(plots) the GDP trend of the fetched
+    GDP values (see fetch_country_gdp()).
+
+    Input:
+        df_final: Pandas DataFrame
+        country_names: tuple(strings)
+            name of the countries
+        executor: ProcessPoolExecutor
+            render the chart headless on this pool, see render_chart()
+
+    Return:
+        list: the rendered charts, see render_chart()
+    """
+
     if len(df_final):
-        df_final.transpose().plot(marker='o')
+        return [render_chart(executor, chart_file_name("gdp", *country_names), plot_country_gdp, df_final)]
+
+    print("Data is not available for selected Country")
+    return []
+
+
+def plot_country_performance(df, country_name):
+    """
+    This function plots the bar graph of the medal counts
+    (columns of 'df') of a country in the olympics (rows).
+    """
+
+    df.plot.bar(ax=plt.gca())
+    
+    plt.title("{}'s Performance in Olympic: Tokyo 2020, Rio 2016 & London 2012".format(country_name))
+    plt.legend(loc='upper right')
+    plt.xticks(rotation=0)
+    plt.xlabel("Olympic Names")
+    plt.ylabel("Medals Counts")
+    plt.grid(color="gray")
 
-        plt.title("GDP")
-        plt.legend(loc='upper left')
-        plt.xlabel("Year")
-        plt.ylabel("GDP Value (in Billions of U.S. dollars)")
-        plt.grid(color="gray")
-        plt.show()
-    else:
-        print("Data is not available for selected Country")
     return None
 
 
-def get_country_performance(cursor, country_name):
+def get_country_performance(storage, country_name, executor=None):
     """
     This function prints a dataframe with all the four medal counts
     ("Gold_Medals", "Silver_Medals", "Bronze_Medals", "Total_Medals")
@@ -246,133 +815,358 @@ def get_country_performance(cursor, country_name):
     for the given country name and also plot the results.
     
     Input:
-        cursor: MySQLCursor
-            cursor object to interact with the MySQL database server
+        storage: StorageBackend
+            connection to the database with the stored tables
         
         country_name: string
             name of the countries
+
+        executor: ProcessPoolExecutor
+            render the chart headless on this pool, see render_chart()
         
-    Return: None
+    Return:
+        list: the rendered charts, see render_chart()
+    """
+
+    df = fetch_country_performance(storage, country_name)
+
+    return render_country_performance(df, country_name, executor)
+
+
+@profiled
+def fetch_country_performance(storage, country_name):
+    """
+    This function returns the four medal counts (columns) of the
+    given country name in all the olympics games (rows).
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        country_name: string
+            name of the countries
+
+    Return:
+        Pandas DataFrame
     """
     
-    olympic_games = ["tokyo_olympic_2020", "rio_olympic_2016", "london_olympic_2012"]
-    data_list = []
-    
-    for olympic in olympic_games:
-        select_all_medals_query = "SELECT gold_medals, silver_medals, bronze_medals, total_medals \
-                                FROM {} WHERE country_name='{}'".format(olympic, country_name)
+    olympic_games = OLYMPIC_GAMES
 
-        cursor.execute(select_all_medals_query)
-        output_records = cursor.fetchall()
-        
-        print(output_records)
+    # id of the country in the 'country' table (-1 matches no rows)
+    country_id = get_country_ids(storage, [country_name]).get(country_name, -1)
 
-        if len(output_records) == 0:
-            data_list.append((0,0,0,0))
-        else:
-            data_list.append(output_records[0])
+    # medal counts of the country in all the olympics (primary key lookup)
+    select_all_medals_query = "SELECT games_id, gold_medals, silver_medals, bronze_medals, total_medals \
+                            FROM olympic_medals WHERE country_id = %s"
+    output_records = storage.query(select_all_medals_query, (country_id,))
 
-    df = pd.DataFrame(data=data_list,
-                      index=olympic_games, 
+    # 0 medals for the olympics without a record of the country
+    df = pd.DataFrame(data=[record[1:] for record in output_records],
+                      index=[record[0] for record in output_records],
                       columns=["Gold_Medals", "Silver_Medals", "Bronze_Medals", "Total_Medals"]
-                     )
+                     ).reindex(olympic_games, fill_value=0)
+
+    return df
+
+
+def render_country_performance(df, country_name, executor=None):
+    """
+    This function prints and shows(plots) the fetched medal counts
+    of a country (see fetch_country_performance()).
+
+    Input:
+        df: Pandas DataFrame
+        country_name: string
+            name of the countries
+        executor: ProcessPoolExecutor
+            render the chart headless on this pool, see render_chart()
+
+    Return:
+        list: the rendered charts, see render_chart()
+    """
+
     print(df)
 
     # plot the bar graph
-    df.plot.bar()
+    return [render_chart(executor, chart_file_name("performance", country_name), plot_country_performance,
+                         df, country_name)]
+
+
+def plot_medal_comparison(df_olympic_medals, medal, olympics):
+    """
+    This function plots the bar graphs of the medal counts of all
+    the countries (rows of 'df_olympic_medals') in the olympics.
+    """
+
+    pos = list(range(len(df_olympic_medals[olympics[0]])))
+    width = 0.30
+
+    # plot the bar graphs
+    plt.bar(pos, df_olympic_medals[olympics[0]], width, \
+            tick_label=df_olympic_medals.index,color='orange')
     
-    plt.title("{}'s Performance in Olympic: Tokyo 2020, Rio 2016 & London 2012".format(country_name))
-    plt.legend(loc='upper right')
-    plt.xticks(rotation=0)
-    plt.xlabel("Olympic Names")
-    plt.ylabel("Medals Counts")
-    plt.grid(color="gray")
-    plt.show()
+    plt.bar([p + width for p in pos], df_olympic_medals[olympics[1]], \
+            width, color='darkturquoise')
     
+    plt.bar([p + width*2 for p in pos], df_olympic_medals[olympics[2]], \
+            width, color='purple',)
+
+    # set plot axes parameters
+    plt.title("{} Comparison".format(str(medal).capitalize()))
+    plt.legend(olympics, loc='upper left')
+    plt.xticks(rotation=90)
+    plt.xlabel("Country Names")
+    plt.ylabel("{}".format(str(medal).capitalize()))
+    plt.grid(color="gray")
+
     return None
 
 
-def get_all_trends(cursor, country_name):
+def get_all_trends(storage, country_name, executor=None):
     """
     This Function plots all the trends for a country
 
     Input:
-        cursor: MySQLCursor
-            cursor object to interact with the MySQL database server
+        storage: StorageBackend
+            connection to the database with the stored tables
         
         country_name: string
             name of the country
 
-    Return: None
+        executor: ProcessPoolExecutor
+            render the charts headless on this pool, see render_chart()
+
+    Return:
+        list: the rendered charts, see render_chart()
     """
     
-    get_country_performance(cursor, country_name)
+    charts = get_country_performance(storage, country_name, executor)
     
     year_list = [["2020-01-01", "2020-12-31"], ["2021-01-01", "2021-05-30"]]
-    trend_list = ["cumulative_cases", "new_cases", "cumulative_deaths", "new_deaths",\
-                  "people_vaccinated","people_fully_vaccinated"]
     
-    for trend_name in trend_list:
-        covid_death_vac_trend_plot(cursor, list([country_name]), year_list, trend_name)
+    charts += covid_death_vac_trend_plots(storage, list([country_name]), year_list, TREND_METRICS, executor)
 
-    get_country_gdp(cursor, tuple([country_name]))
+    charts += get_country_gdp(storage, tuple([country_name]), executor)
     
+    return charts
+
+
+@profiled
+def load_report_data(storage):
+    """
+    This function loads all the medal counts, per population covid rates
+    and GDP values once (one query per table) and groups them by country,
+    so the views of every country are built without another query.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+    Return:
+        dict: {"medals"/"trends"/"gdp": {country_name: Pandas DataFrame}}
+    """
+
+    country_names = get_country_names(storage)
+    medal_cols = ["Gold_Medals", "Silver_Medals", "Bronze_Medals", "Total_Medals"]
+
+    df_medals = pd.DataFrame(storage.query("SELECT country_id, games_id, gold_medals, silver_medals, \
+                                           bronze_medals, total_medals FROM olympic_medals"),
+                             columns=["Country_Id", "Games_Id"] + medal_cols)
+
+    df_trends = pd.DataFrame(storage.query("SELECT country_id, date_reported, {} FROM covid_per_capita".
+                                           format(", ".join(TREND_METRICS))),
+                             columns=["Country_Id", "Reported_Date"] + TREND_METRICS)
+    df_trends["Reported_Date"] = pd.to_datetime(df_trends["Reported_Date"])
+
+    df_gdp = pd.DataFrame(storage.query("SELECT country_id, {} FROM gdp_value".format(", ".join(GDP_YEARS))),
+                          columns=["Country_Id"] + GDP_YEARS)
+
+    # Group every table by country once
+    return {
+        "medals": {country_names[i]: df.set_index("Games_Id")[medal_cols].reindex(OLYMPIC_GAMES, fill_value=0)
+                   for i, df in df_medals.groupby("Country_Id")},
+        "trends": {country_names[i]: df.set_index("Reported_Date")[TREND_METRICS].sort_index()
+                   for i, df in df_trends.groupby("Country_Id")},
+        "gdp": {country_names[i]: df.set_index(pd.Index([country_names[i]]))[GDP_YEARS]
+                for i, df in df_gdp.groupby("Country_Id")}
+    }
+
+
+def plot_country_trends(df_trends, country_name):
+    """
+    This function plots all the per population covid and vaccination
+    metrics (columns of 'df_trends') of a country over the reported date.
+    """
+
+    # zero rates cannot be drawn on the log scale
+    df_trends.where(df_trends > 0).plot(logy=True, ax=plt.gca())
+
+    plt.title("{}: Covid and Vaccination per Population Trend".format(country_name))
+    plt.legend(loc='upper left')
+    plt.xlabel("Reported_Date")
+    plt.ylabel("Metric per Population")
+    plt.grid(color="gray")
+
     return None
 
 
+def markdown_table(df):
+    """
+    This function returns a DataFrame as a Markdown table.
+    """
+
+    rows = [[str(df.index.name or "")] + [str(col) for col in df.columns]]
+    rows += [[str(index)] + [str(value) for value in values] for index, values in zip(df.index, df.to_numpy())]
+
+    lines = ["| " + " | ".join(row) + " |" for row in rows]
+    lines.insert(1, "|" + " --- |" * len(rows[0]))
+
+    return "\n".join(lines)
+
+
+@profiled
+def generate_report(storage, report_dir, report_format=None, executor=None):
+    """
+    This function writes a static report of all the countries with their
+    medal counts, covid trends and GDP, and all their charts. The data is
+    loaded once (see load_report_data()), so the cost grows with the size
+    of the data and not with the number of countries.
+
+    Input:
+        storage: StorageBackend
+            connection to the database with the stored tables
+
+        report_dir: string
+            directory of the report, the charts are written in 'charts'
+
+        report_format: string
+            "html" or "markdown", default REPORT_FORMAT
+
+        executor: ProcessPoolExecutor
+            render the charts on this pool, see render_chart()
+
+    Return:
+        string: path of the report file
+    """
+
+    report_format = report_format or REPORT_FORMAT
+    chart_dir = path.join(report_dir, "charts")
+    makedirs(chart_dir, exist_ok=True)
+
+    data = load_report_data(storage)
+    country_names = sorted(set(data["medals"]) | set(data["trends"]) | set(data["gdp"]))
+
+    charts = []
+    sections = []
+
+    for country_name in country_names:
+        df_performance = data["medals"].get(country_name)
+        df_trends = data["trends"].get(country_name)
+        df_gdp = data["gdp"].get(country_name)
+
+        # charts of the country: (title, file name)
+        images = []
+
+        if df_performance is not None:
+            file_name = chart_file_name("performance", country_name)
+            charts.append(render_chart(executor, file_name, plot_country_performance,
+                                       df_performance, country_name, render_dir=chart_dir))
+            images.append(("Olympic medals", file_name))
+
+        if df_trends is not None and (df_trends > 0).any(axis=None):
+            file_name = chart_file_name("trends", country_name)
+            charts.append(render_chart(executor, file_name, plot_country_trends,
+                                       df_trends, country_name, render_dir=chart_dir))
+            images.append(("Covid and vaccination trends", file_name))
+
+        if df_gdp is not None:
+            file_name = chart_file_name("gdp", country_name)
+            charts.append(render_chart(executor, file_name, plot_country_gdp, df_gdp, render_dir=chart_dir))
+            images.append(("GDP", file_name))
+
+        sections.append((country_name, df_performance, images))
+
+    # Write the report while the charts are being rendered
+    image_path = "charts/{}." + RENDER_FORMATS[0]
+
+    if report_format == "html":
+        report_path = path.join(report_dir, "report.html")
+        lines = ["<!DOCTYPE html>", "<html><head><meta charset=\"utf-8\"><title>Country Report</title></head>",
+                 "<body>", "<h1>Country Report</h1>"]
+
+        for country_name, df_performance, images in sections:
+            lines.append("<h2>{}</h2>".format(escape(country_name)))
+
+            if df_performance is not None:
+                lines.append(df_performance.to_html())
+
+            for title, file_name in images:
+                lines.append("<h3>{}</h3><img src=\"{}\" alt=\"{}\">".format(
+                    title, escape(image_path.format(file_name)), escape(title)))
+
+        lines.append("</body></html>")
+    else:
+        report_path = path.join(report_dir, "report.md")
+        lines = ["# Country Report", ""]
+
+        for country_name, df_performance, images in sections:
+            lines += ["## {}".format(country_name), ""]
+
+            if df_performance is not None:
+                lines += [markdown_table(df_performance), ""]
+
+            for title, file_name in images:
+                lines += ["### {}".format(title), "", "![{}]({})".format(title, image_path.format(file_name)), ""]
+
+    with open(report_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    # Wait for the charts rendered on the process pool
+    if executor is not None:
+        for chart in charts:
+            chart.result()
+
+    print("Report of {} countries written to {}".format(len(sections), report_path))
+
+    return report_path
+
+
 def main():
     """
-    This functions queries required data from MySQL database and
+    This functions queries required data from the database and
     plots graphs for analysis.
     """
-    # Connect and Login into SQL database
-    connection = mysql.connector.connect(user=input("Enter username: "), password=getpass("Enter password: ")) 
-    cursor = connection.cursor()
+    # Connect to the database (backend selected in dmp_storage) with a pool
+    # of connections for the concurrent queries, and cache the query results,
+    # which are requested again for overlapping countries
+    pool = connect_storage_pool()
+    pool.enable_result_cache()
 
-    # Select the database
-    select_db_query = "use olympic"
-    cursor.execute(select_db_query)
+    # Report mode: the report of all the countries, from a single data load
+    if REPORT_DIR is not None:
+        plt.switch_backend("Agg")
 
-    # Analyse Performance of the countries in the three Olympic Games
+        with ProcessPoolExecutor(max_workers=MAX_RENDER_WORKERS) as report_executor:
+            pool.call(generate_report, REPORT_DIR, executor=report_executor)
 
-    # Define the list of the olympics and medal types we want to compare
-    olympics = ["tokyo_olympic_2020", "rio_olympic_2016", "london_olympic_2012"]
-    medal_type = ["total_medals", "gold_medals", "silver_medals", "bronze_medals"]
+        # Write the profile of the run (when enabled, see dmp_profiling)
+        PROFILER.write("analysis")
 
+        pool.close()
+        return None
 
-    # Iterate over the country names and plot
-    for medal in medal_type:
-        
-        # set plot figure parameters
-        plt.rcParams['axes.facecolor'] = "White"
-        
-        # get the medal count of all the countries
-        df_olympic_medals = get_all_country_performance(cursor, olympics, medal)
-    
-        pos = list(range(len(df_olympic_medals[olympics[0]])))
-        width = 0.30
+    # Render the charts to files on a process pool in headless mode
+    executor = None
+    charts = []
 
-        # plot the bar graphs
-        plt.bar(pos, df_olympic_medals[olympics[0]], width, \
-                tick_label=df_olympic_medals.index,color='orange')
-        
-        plt.bar([p + width for p in pos], df_olympic_medals[olympics[1]], \
-                width, color='darkturquoise')
-        
-        plt.bar([p + width*2 for p in pos], df_olympic_medals[olympics[2]], \
-                width, color='purple',)
-
-        # set plot axes parameters
-        plt.title("{} Comparison".format(str(medal).capitalize()))
-        plt.legend(olympics, loc='upper left')
-        plt.xticks(rotation=90)
-        plt.xlabel("Country Names")
-        plt.ylabel("{}".format(str(medal).capitalize()))
-        plt.grid(color="gray")
-        plt.show()
+    if RENDER_DIR is not None:
+        makedirs(RENDER_DIR, exist_ok=True)
+        plt.switch_backend("Agg")
+        executor = ProcessPoolExecutor(max_workers=MAX_RENDER_WORKERS)
 
-    
-    # Plot the trends for the available metrices for countries
+    # Define the list of the olympics and medal types we want to compare
+    olympics = OLYMPIC_GAMES
+    medal_type = ["total_medals", "gold_medals", "silver_medals", "bronze_medals"]
 
     # Analysis for 5 countries for which we observed a drop in number of medals
     # define the start and end time for which we want to observe the values
@@ -381,16 +1175,6 @@ def main():
     # define the countries for which we want to observe the values
     countries = ["Argentina","Bahrain", "Colombia", "Taiwan", "Thailand","Venezuela"]
 
-    # define the metrices for which we want to observe the plot
-    trend_list = ["cumulative_cases", "new_cases", "cumulative_deaths", "new_deaths",\
-                    "people_vaccinated","people_fully_vaccinated"]
-
-    for trend_name in trend_list:
-        covid_death_vac_trend_plot(cursor, countries, years, trend_name)
-        
-    get_country_gdp(cursor, tuple(countries))
-
-
     # Analysis for 5 countries for which we don't observe a drop in number of medals
     # define the start and end time for which we want to observe the values
     year_list = [["2020-01-01", "2020-12-31"], ["2021-01-01", "2021-06-30"]]
@@ -398,26 +1182,88 @@ def main():
     # define the countries for which we want to observe the values
     country_name_list = ["Netherlands", "Poland", "Italy", "United Kingdom"]
 
-    # define the metrices for which we want to observe the plot
-    trend_list = ["cumulative_cases", "new_cases", "cumulative_deaths", "new_deaths",\
-                    "people_vaccinated","people_fully_vaccinated"]
+    # Analysis for any user selected country
+
+    # Enter the country name
+    country = input("Enter Country Name: ")
+    country_year_list = [["2020-01-01", "2020-12-31"], ["2021-01-01", "2021-05-30"]]
+
+
+    # Submit all the independent queries at once and gather the results
+    # before plotting, so the fetch takes as long as the slowest query
+    with PROFILER.stage("fetch"):
+        fetches = {
+            "deviations": pool.submit(get_medal_deviations),
+            "trends": pool.submit(get_covid_death_vac_metrics, countries, years, TREND_METRICS),
+            "gdp": pool.submit(fetch_country_gdp, tuple(countries)),
+            "trends_list": pool.submit(get_covid_death_vac_metrics, country_name_list, year_list, TREND_METRICS),
+            "gdp_list": pool.submit(fetch_country_gdp, tuple(country_name_list)),
+            "performance_country": pool.submit(fetch_country_performance, country),
+            "trends_country": pool.submit(get_covid_death_vac_metrics, [country], country_year_list, TREND_METRICS),
+            "gdp_country": pool.submit(fetch_country_gdp, (country,)),
+            **{medal: pool.submit(get_all_country_performance, olympics, medal) for medal in medal_type}
+        }
+        data = {name: future.result() for name, future in fetches.items()}
+
+
+    # Analyse Performance of the countries in the three Olympic Games
+
+    # set plot figure parameters
+    plt.rcParams['axes.facecolor'] = "White"
+
+    # Iterate over the country names and plot
+    for medal in medal_type:
+
+        # plot the bar graphs of the medal count of all the countries
+        charts.append(render_chart(executor, chart_file_name("comparison", medal), plot_medal_comparison,
+                                   data[medal], medal, olympics))
 
-    for trend_name in trend_list:
-        covid_death_vac_trend_plot(cursor, country_name_list, year_list, trend_name)
+    
+    # Deviation of the Tokyo 2020 medals from Rio 2016 and London 2012
+    deviations = data["deviations"]
+
+    print("Largest declines in total medals at {}:".format(deviations.target_games))
+    print(deviations.top_decliners("total_medals", 10)[["target", "baseline_mean", "deviation",
+                                                         "relative_deviation", "rank_shift"]])
+
+    
+    # Plot the trends for the available metrices for countries
+
+    # plot all the metrices from a single fetch
+    charts += render_covid_death_vac_trends(data["trends"], countries, TREND_METRICS, executor)
+        
+    charts += render_country_gdp(data["gdp"], tuple(countries), executor)
+
+    charts += render_covid_death_vac_trends(data["trends_list"], country_name_list, TREND_METRICS, executor)
         
-    get_country_gdp(cursor, tuple(country_name_list))
+    charts += render_country_gdp(data["gdp_list"], tuple(country_name_list), executor)
 
+    # all the trends of the user selected country
+    charts += render_country_performance(data["performance_country"], country, executor)
 
-    # Analysis for any user selected country
+    charts += render_covid_death_vac_trends(data["trends_country"], [country], TREND_METRICS, executor)
 
-    # Enter the country name
-    country = input("Enter Country Name: ")
-    get_all_trends(cursor, country)
+    charts += render_country_gdp(data["gdp_country"], (country,), executor)
+
+    # Wait for the charts rendered on the process pool
+    if executor is not None:
+        with PROFILER.stage("render") as stage:
+            file_count = stage["rows"] = sum(len(chart.result()) for chart in charts)
+            executor.shutdown()
+        print("{} chart files written to {}".format(file_count, RENDER_DIR))
+
+
+    # Report the reuse of the prepared statements and of the query results
+    print("Prepared statements: {hits} hits, {misses} misses, {statements} cached".
+          format(**pool.statement_stats()))
+    print("Query results: {hits} hits, {misses} misses ({hit_rate:.0%} hit rate), "
+          "{evictions} evictions, {invalidations} invalidations".format(**pool.result_cache.stats()))
 
+    # Write the profile of the run (when enabled, see dmp_profiling)
+    PROFILER.write("analysis")
 
     # Close the database connections
-    cursor.close()
-    connection.close()
+    pool.close()
 
 
 
@@ -5,18 +5,299 @@ This module performs the cleaning of the collected datasets
 and then stores the cleaned data in SQL database tables.
 
 We use Python Pandas package to import the data and then transform
-it to the desired format. MySQL Connector Python package is used to
-connect to a MySQL database server and store the cleaned data 
+it to the desired format. The cleaned data is stored in a MySQL
+database server or in an embedded SQLite/DuckDB database, through the
+storage interface of the dmp_storage module.
 """
 
 author = "Tanuja Seervi, Bikiran Choudhury"
 
 
+import importlib.util
+import numpy as np
 import pandas as pd
-from os import path
+import re
+import unicodedata
+from glob import glob
+from hashlib import sha256
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs, path, remove
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+
+from dmp_profiling import PROFILER, profiled
+from dmp_storage import connect_storage
+
+
+# Parenthesis and any content and whitespace around it in country names
+PARENTHESIS_REGEX = re.compile(r"\s*\(.*\)\s*")
+
+# Number of worker processes reading and cleaning the datasets in parallel
+# (None uses the number of CPUs)
+MAX_WORKERS = None
+
+# Cache the cleaned datasets, keyed on the content of the data files
+USE_CACHE = True
+
+# Directory of the cache (None uses ".cache" in the data directory)
+CACHE_DIR = None
+
+# Format of the cached datasets (Parquet needs pyarrow)
+CACHE_FORMAT = "parquet" if importlib.util.find_spec("pyarrow") else "pickle"
+
+# Version of the cleaning logic, increase it whenever a clean_* function
+# changes so that the cached datasets are cleaned again
+CLEANING_VERSION = 6
+
+# Number of rows written per INSERT batch (one commit per batch)
+BATCH_SIZE = 10000
+
+# Use "LOAD DATA LOCAL INFILE" instead of batched INSERTs
+# (the MySQL server must have 'local_infile' enabled)
+USE_LOAD_DATA = False
+
+# Number of rows of Covid_Vaccination_Data.csv read and written per chunk
+CHUNK_SIZE = 100000
+
+# Check the rows against the constraints of their table before writing them.
+# The rows which violate a constraint are appended to '<REJECT_DIR>/<table>.csv'
+# with the reasons, instead of failing the load.
+VALIDATE_ROWS = True
+REJECT_DIR = path.join(path.dirname(path.abspath(__file__)), "rejects")
+
+# Bits of the integer column types of the table definitions
+INTEGER_TYPE_BITS = {"TINYINT": 8, "SMALLINT": 16, "MEDIUMINT": 24, "INT": 32, "BIGINT": 64}
+
+# Column definitions and unique keys of the table definitions
+COLUMN_DEF_REGEX = re.compile(r"^\s*(\w+) (\w+)(?:\((\d+)\))?( UNSIGNED)?( NOT NULL)?", re.MULTILINE)
+UNIQUE_KEY_REGEX = re.compile(r"(?:PRIMARY KEY|UNIQUE)\s*\(([^)]*)\)")
+
+# Columns of every dataset that are kept, with the dtypes used while parsing.
+# Only these columns are read from the data files. The memory is saved on
+# the string columns (categories); the counters are parsed in 64 bits (as
+# many bytes as the default parse) because a narrow parse dtype silently
+# wraps the negative and out of range values. They are narrowed only after
+# their rows are validated (see narrow_dtypes).
+DTYPE_SCHEMA = {
+    # the medal counts are never missing, and every country has one row
+    # (a category column would only add its codes)
+    "tokyo": {"Country": "str", "Gold Medal": "int64", "Silver Medal": "int64",
+              "Bronze Medal": "int64", "Total": "int64", "Rank By Total": "int64"},
+
+    "rio": {"Country": "str", "Gold": "int64", "Silver": "int64", "Bronze": "int64"},
+
+    "london": {"Country": "str", "Gold Medal": "int64", "Silver Medal": "int64",
+               "Bronze Medal": "int64", "Total": "int64"},
+
+    # values in thousands, converted to uint32 after rectifying them
+    "population": {"name": "category", "pop2020": "float64", "pop2021": "float64"},
+
+    # 'no data' entries are parsed as missing values
+    "gdp": {"GDP, current prices (Billions of U.S. dollars)": "category",
+            **{str(year): "float32" for year in range(2012, 2022)}},
+
+    # The covid counters are often missing, so they are parsed as floats
+    # (exact up to 2**53). 'iso_code' is stored in the 'country' table.
+    "covid": {"location": "category", "date": "datetime64[s]", "total_cases": "float64", "new_cases": "float64",
+              "total_deaths": "float64", "new_deaths": "float64", "people_vaccinated": "float64",
+              "people_fully_vaccinated": "float64", "iso_code": "category"}
+}
+
+# Extra parsing options of the datasets
+READ_OPTIONS = {
+    "gdp": {"encoding": "ISO-8859-1", "na_values": ["no data"]},
+    "covid": {"date_format": "%Y-%m-%d"}
+}
+
+# dtypes of the validated covid_and_vac chunks (the missing values are 0)
+COVID_VAC_STORAGE_DTYPES = {
+    "total_cases": "uint32", "new_cases": "int32", "total_deaths": "uint32", "new_deaths": "int32",
+    "people_vaccinated": "uint32", "people_fully_vaccinated": "uint32"
+}
+
+# dtype of the validated medal counts
+MEDAL_STORAGE_DTYPE = "uint16"
+
+# Print the memory used by the datasets with and without DTYPE_SCHEMA
+# (parses the first MEMORY_REPORT_ROWS rows of every file twice)
+MEMORY_REPORT = False
+MEMORY_REPORT_ROWS = 100000
+
+# Non-country entries of Covid_Vaccination_Data.csv
+NON_COUNTRY_LOCATIONS = ["Africa", "Asia", "Europe", "European Union", "High income",
+                         "International", "Low income", "Lower middle income",
+                         "North America", "Oceania", "South America", "Upper middle income", "World"]
+
+# Column names of the database tables in the order of the cleaned DataFrames
+TABLE_COLUMNS = {
+    "country": ["country_id", "country_name", "iso_code"],
+    "olympic_medals": ["games_id", "country_id", "gold_medals", "silver_medals", "bronze_medals", "total_medals"],
+    "population": ["country_id", "pop_2020", "pop_2021"],
+    "covid_and_vac": ["country_id", "date_reported", "cumulative_cases", "new_cases",
+                      "cumulative_deaths", "new_deaths", "people_vaccinated", "people_fully_vaccinated"],
+    "covid_per_capita": ["country_id", "date_reported", "cumulative_cases", "new_cases",
+                         "cumulative_deaths", "new_deaths", "people_vaccinated", "people_fully_vaccinated"],
+    "gdp_value": ["country_id", "gdp_2012", "gdp_2013", "gdp_2014", "gdp_2015", "gdp_2016",
+                  "gdp_2017", "gdp_2018", "gdp_2019", "gdp_2020", "gdp_2021"],
+    "country_alias": ["alias_name", "country_id", "source"]
+}
+
+# Definitions of the database tables. Every table refers to the countries
+# by the 2-byte 'country_id' of the 'country' dimension table, which is
+# indexed in every table by its unique constraint.
+TABLES_DEF = {
+    "country" : """
+                    CREATE TABLE IF NOT EXISTS country (
+                        country_id SMALLINT UNSIGNED NOT NULL,
+                        country_name VARCHAR(60) NOT NULL,
+                        iso_code CHAR(3),
+
+                        PRIMARY KEY (country_id),
+                        CONSTRAINT uniq_constraint UNIQUE(country_name)
+                    )
+                """,
+
+    # Medal counts of all the Olympic Games editions (OLYMPIC_GAMES), one
+    # row per edition and country. The composite primary key indexes the
+    # lookups of a country across the editions.
+    "olympic_medals" : """
+                            CREATE TABLE IF NOT EXISTS olympic_medals (
+                                games_id VARCHAR(30) NOT NULL,
+                                country_id SMALLINT UNSIGNED NOT NULL,
+                                gold_medals INT NOT NULL,
+                                silver_medals INT NOT NULL,
+                                bronze_medals INT NOT NULL,
+                                total_medals INT NOT NULL,
+
+                                PRIMARY KEY (country_id, games_id),
+                                FOREIGN KEY (country_id) REFERENCES country(country_id)
+                            )
+                        """,
+
+    "population" : """
+                    CREATE TABLE IF NOT EXISTS population (
+                        country_id SMALLINT UNSIGNED NOT NULL,
+                        pop_2020 INT UNSIGNED NOT NULL,
+                        pop_2021 INT UNSIGNED NOT NULL,
+
+                        CONSTRAINT uniq_constraint UNIQUE(country_id),
+                        FOREIGN KEY (country_id) REFERENCES country(country_id)
+                    )
+                """,
+
+    "covid_and_vac" : """
+                        CREATE TABLE IF NOT EXISTS covid_and_vac (
+                            country_id SMALLINT UNSIGNED NOT NULL,
+                            date_reported DATE NOT NULL,
+                            cumulative_cases INT UNSIGNED NOT NULL,
+                            new_cases INT NOT NULL,
+                            cumulative_deaths INT UNSIGNED NOT NULL,
+                            new_deaths INT NOT NULL,
+                            people_vaccinated INT UNSIGNED NOT NULL,
+                            people_fully_vaccinated INT UNSIGNED NOT NULL,
+
+                            CONSTRAINT uniq_constraint UNIQUE(country_id, date_reported),
+                            FOREIGN KEY (country_id) REFERENCES country(country_id)
+                        )
+                    """,
+
+    # Metrics of covid_and_vac divided by the population of the reported
+    # year, computed by the loader (see compute_per_capita)
+    "covid_per_capita" : """
+                        CREATE TABLE IF NOT EXISTS covid_per_capita (
+                            country_id SMALLINT UNSIGNED NOT NULL,
+                            date_reported DATE NOT NULL,
+                            cumulative_cases DOUBLE NOT NULL,
+                            new_cases DOUBLE NOT NULL,
+                            cumulative_deaths DOUBLE NOT NULL,
+                            new_deaths DOUBLE NOT NULL,
+                            people_vaccinated DOUBLE NOT NULL,
+                            people_fully_vaccinated DOUBLE NOT NULL,
+
+                            CONSTRAINT uniq_constraint UNIQUE(country_id, date_reported),
+                            FOREIGN KEY (country_id) REFERENCES country(country_id)
+                        )
+                    """,
 
-import mysql.connector
-from getpass import getpass
+    "gdp_value" : """
+                    CREATE TABLE IF NOT EXISTS gdp_value (
+                        country_id SMALLINT UNSIGNED NOT NULL,
+                        gdp_2012 FLOAT NOT NULL,
+                        gdp_2013 FLOAT NOT NULL,
+                        gdp_2014 FLOAT NOT NULL,
+                        gdp_2015 FLOAT NOT NULL,
+                        gdp_2016 FLOAT NOT NULL,
+                        gdp_2017 FLOAT NOT NULL,
+                        gdp_2018 FLOAT NOT NULL,
+                        gdp_2019 FLOAT NOT NULL,
+                        gdp_2020 FLOAT NOT NULL,
+                        gdp_2021 FLOAT NOT NULL,
+
+                        CONSTRAINT uniq_constraint UNIQUE(country_id),
+                        FOREIGN KEY (country_id) REFERENCES country(country_id)
+                    )
+                """,
+
+    "country_alias" : """
+                        CREATE TABLE IF NOT EXISTS country_alias (
+                            alias_name VARCHAR(60) NOT NULL,
+                            country_id SMALLINT UNSIGNED NOT NULL,
+                            source VARCHAR(60) NOT NULL,
+
+                            CONSTRAINT uniq_constraint UNIQUE(alias_name),
+                            FOREIGN KEY (country_id) REFERENCES country(country_id)
+                        )
+                    """,
+
+    # Single row counter bumped by every load, which invalidates the
+    # cached query results of the analysis (see dmp_storage.QueryCache)
+    "data_version" : """
+                        CREATE TABLE IF NOT EXISTS data_version (
+                            version INT UNSIGNED NOT NULL
+                        )
+                    """
+    }
+
+# Secondary indexes of the tables: name -> (table, columns). The medals of
+# the compared editions (WHERE games_id IN ...) cannot use the primary key
+# (country_id, games_id) of 'olympic_medals'.
+INDEXES_DEF = {
+    "olympic_medals_games": ("olympic_medals", ["games_id", "country_id"])
+}
+
+# File with the curated country name aliases (raw name -> population name),
+# which is only read
+ALIAS_FILE = path.join(path.dirname(path.abspath(__file__)), "country_aliases.csv")
+
+# File with the aliases matched by the runs which are not in ALIAS_FILE
+LEARNED_ALIAS_FILE = path.join(path.dirname(path.abspath(__file__)), "learned_aliases.csv")
+
+# Minimum score (difflib ratio) of a fuzzy match of a country name to be applied
+MATCH_CUTOFF = 0.8
+
+# Data files read and cleaned as a whole by load_source()
+# (Covid_Vaccination_Data.csv is streamed, see stream_covid_vac)
+SOURCE_FILES = {
+    "tokyo": "Tokyo_Medals_2020.csv",
+    "rio": "Rio_Medals_2016.csv",
+    "london": "London_Medals_2012.csv",
+    "population": "Population_2020-21.csv",
+    "gdp": "GDP_Actual_Value.csv"
+}
+
+# Olympic Games editions stored in the 'olympic_medals' table, by their
+# key in SOURCE_FILES. A new edition only needs entries in SOURCE_FILES,
+# DTYPE_SCHEMA and here; its dataset is cleaned by clean_medals().
+OLYMPIC_GAMES = {
+    "tokyo": "tokyo_olympic_2020",
+    "rio": "rio_olympic_2016",
+    "london": "london_olympic_2012"
+}
+
+# File of the streamed dataset
+COVID_VAC_FILE = "Covid_Vaccination_Data.csv"
 
 
 def fix_column_name(df):
@@ -39,6 +320,34 @@ def fix_column_name(df):
     return None
 
 
+def narrow_dtypes(df, dtypes):
+    """
+    This function converts the given columns to their compact integer
+    dtypes, only when all their values fit in the dtype. A column with
+    missing or out of range values keeps its dtype, so that its rows are
+    rejected by validate_dataframe() instead of being silently rewritten.
+
+    Input:
+        df: Pandas DataFrame
+        dtypes: dict
+            {column: integer dtype}
+
+    Return:
+        Pandas DataFrame
+    """
+
+    conversions = {}
+
+    for col, dtype in dtypes.items():
+        info = np.iinfo(dtype)
+        values = df[col]
+
+        if not len(values) or (values.notna().all() and values.min() >= info.min and values.max() <= info.max):
+            conversions[col] = dtype
+
+    return df.astype(conversions)
+
+
 def find_total_missing_val_and_loc(df):
     
     """
@@ -54,46 +363,74 @@ def find_total_missing_val_and_loc(df):
     
     """
 
-    missing_val = df.isnull().sum()
+    # rows with a missing value, without transposing the frame
+    missing_rows = df.isnull().any(axis=1)
     
-    if sum(missing_val):
-        return df.loc[df.isnull().T.any()]
+    if missing_rows.any():
+        return df.loc[missing_rows]
 
     else:
         return None
 
 
+def normalize_country_name(name):
+    
+    """
+    Return the Unicode normal form of a country name
+    without underscores, parenthesis and diacritics.
+    
+    Input:
+        name: string
+    
+    Returns
+        string
+    """
+
+    # Replace `_` with whitespace
+    name = name.replace("_", " ")
+
+    # Remove parenthesis and any content and whitespace around it
+    name = PARENTHESIS_REGEX.sub("", name)
+
+    # normalise the string value to remove symbols and diacritics
+    name = unicodedata.normalize("NFKD", name)
+
+    return name.encode("ascii", errors="ignore").decode("utf-8")
+
+
+@profiled
 def normalize_country_names(df, country_col):
     
     """
     Return the Unicode normal form of the strings of the
     Pandas Series with the name: country_col.
+
+    The column is replaced in place (the DataFrame is not copied)
+    by a categorical column. Every distinct country name is
+    normalized only once.
        
     Input:
         df: Pandas DataFrame
         country_col: string
     
     Returns
-        df_tmp: Pandas Series
+        df: Pandas DataFrame
     """
     
-    # Get the column which is having country name from the table
-    df_tmp = df.copy() 
-    country_names = df_tmp[country_col]
-
-    # Replace `_` with whitespace
-    country_names = country_names.str.replace("_", " ")
-
-    # Remove parenthesis and any content and whitespace around it
-    country_names = country_names.str.replace("\s*\(.*\)\s*", '',regex=True)
-    
-    # normalise the string values to remove symbols and diacritics
-    norm_name = country_names.str.normalize('NFKD')
-    norm_name = norm_name.str.encode('ascii',errors='ignore').str.decode('utf-8')
-
-    df_tmp[country_col] = country_names
+    # Encode the column as codes into its distinct country names
+    codes, unique_names = pd.factorize(df[country_col])
+
+    # Normalize the distinct names only. Different raw names can have
+    # the same normal form, so re-encode them into distinct categories.
+    norm_names = pd.Index([normalize_country_name(name) for name in unique_names])
+    categories = norm_names.unique()
+    norm_codes = categories.get_indexer(norm_names)
+
+    # Map the normalized names back through the codes (-1 is a missing value)
+    codes = np.where(codes >= 0, norm_codes[codes], -1)
+    df[country_col] = pd.Categorical.from_codes(codes, categories=categories)
     
-    return df_tmp
+    return df
 
 
 def filter_unmatched_index(df_primary, df_ancillary, col_primary, col_ancillary):
@@ -119,7 +456,407 @@ def filter_unmatched_index(df_primary, df_ancillary, col_primary, col_ancillary)
     return index_nulls
 
 
-def get_close_matches(name, list_compare, pad=True):
+class CountryMatcher:
+    """
+    Fuzzy matcher of country names against a master list of names
+    (e.g. the 'name' column of the population table).
+
+    A character trigram index of the master list is built once. A query
+    only scores the names which share trigrams with it, instead of
+    scanning the whole list like difflib.get_close_matches does. The
+    candidates are scored with the same ratio as difflib.
+
+    Input:
+        names: iterable of strings
+            master list of country names
+        max_candidates: int
+            number of names (with the most shared trigrams)
+            scored for each query
+    """
+
+    def __init__(self, names, max_candidates=10):
+        self.names = list(dict.fromkeys(n for n in names if isinstance(n, str)))
+        self.name_set = set(self.names)
+        self.max_candidates = max_candidates
+
+        # trigram -> positions of the names in self.names
+        self.index = defaultdict(list)
+
+        for pos, name in enumerate(self.names):
+            for gram in self.trigrams(name):
+                self.index[gram].append(pos)
+
+    @staticmethod
+    def trigrams(name):
+        """
+        Return the set of character trigrams of the
+        lowercase name padded with whitespace.
+        """
+
+        padded = "  {} ".format(name.lower())
+
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def query(self, name, k=1, cutoff=0.5, choices=None):
+        """
+        Return the top 'k' names of the master list matching 'name'
+        as a list of (name, score) with a score of at least 'cutoff',
+        best match first.
+
+        Input:
+            name: string
+            k: int
+            cutoff: float in [0, 1]
+            choices: set of strings
+                only consider these names of the master list (optional)
+        """
+
+        shared = Counter()
+
+        for gram in self.trigrams(name):
+            shared.update(self.index.get(gram, ()))
+
+        if choices is not None:
+            shared = Counter({pos: n for pos, n in shared.items() if self.names[pos] in choices})
+
+        scored = []
+        matcher = SequenceMatcher()
+        matcher.set_seq2(name)
+
+        for pos, _ in shared.most_common(max(k, self.max_candidates)):
+            matcher.set_seq1(self.names[pos])
+            score = matcher.ratio()
+
+            if score >= cutoff:
+                scored.append((self.names[pos], score))
+
+        scored.sort(key=lambda x: x[1], reverse=True)
+
+        return scored[:k]
+
+    def best_match(self, name, pad=True, cutoff=0.5, choices=None):
+        """
+        Return the best matching name of the master list for 'name'.
+        If there is no good match, return 'name' itself (pad=True) or None.
+        """
+
+        match_list = self.query(name, k=1, cutoff=cutoff, choices=choices)
+
+        if len(match_list):
+            return match_list[0][0]
+        else:
+            return name if pad else None
+
+    def match_series(self, names, pad=True, cutoff=0.5, choices=None):
+        """
+        Return a Pandas Series with the best match of every value of the
+        Pandas Series 'names'. Every distinct value is matched only once.
+        """
+
+        if choices is not None:
+            choices = set(choices)
+
+        unique_names = names.dropna().unique()
+        matches = {name: self.best_match(name, pad, cutoff, choices) for name in unique_names}
+
+        return names.map(matches)
+
+
+def read_alias_file(file_path):
+    """
+    Return the aliases of a CSV file with the columns "alias_name",
+    "country_name" and "source" as a dict, empty without the file.
+    """
+
+    if not path.exists(file_path):
+        return {}
+
+    df_alias = pd.read_csv(file_path, header=0, dtype=str, keep_default_na=False)
+
+    return {alias: (name, source) for alias, name, source in \
+            zip(df_alias["alias_name"], df_alias["country_name"], df_alias["source"])}
+
+
+def load_country_aliases(file_path=None, learned_file_path=None):
+    """
+    This function loads the country alias table, which maps the raw
+    country names of the datasets to the names used in the population
+    table: the aliases matched by the previous runs, overridden by the
+    curated aliases. A wrong match is corrected by adding the alias to
+    the curated file (or by removing it from the learned file).
+
+    Input:
+        file_path: string
+            CSV file of the curated aliases, default ALIAS_FILE
+        learned_file_path: string
+            CSV file of the learned aliases, default LEARNED_ALIAS_FILE
+
+    Return:
+        dict: {alias_name: (country_name, source)}
+    """
+
+    aliases = read_alias_file(learned_file_path or LEARNED_ALIAS_FILE)
+    aliases.update(read_alias_file(file_path or ALIAS_FILE))
+
+    return aliases
+
+
+def save_country_aliases(aliases, file_path=None):
+    """
+    This function writes the aliases which are not in the curated
+    alias file (ALIAS_FILE, never rewritten) to the learned alias file.
+
+    Input:
+        aliases: dict
+            {alias_name: (country_name, source)}
+        file_path: string
+            default LEARNED_ALIAS_FILE
+
+    Return:
+        None
+    """
+
+    curated = read_alias_file(ALIAS_FILE)
+    learned = {alias: value for alias, value in aliases.items() if curated.get(alias) != value}
+
+    df_alias = alias_table_to_dataframe(learned)
+    df_alias.to_csv(file_path or LEARNED_ALIAS_FILE, index=False)
+
+    return None
+
+
+def alias_table_to_dataframe(aliases):
+    """
+    Return the country alias table as a Pandas DataFrame
+    sorted by the alias name.
+    """
+
+    records = [(alias, name, source) for alias, (name, source) in sorted(aliases.items())]
+
+    return pd.DataFrame(records, columns=["alias_name", "country_name", "source"])
+
+
+def store_country_aliases(storage, aliases, dimension):
+    """
+    This function replaces the content of the 'country_alias'
+    table with the given country alias table. The aliases of the
+    countries which are not stored in the 'country' table (no row of
+    another table refers to them) are left out, so that no country
+    is written for an alias only.
+
+    Input:
+        storage: StorageBackend
+        aliases: dict
+            {alias_name: (country_name, source)}
+        dimension: CountryDimension
+
+    Return:
+        None
+    """
+
+    storage.execute("DELETE FROM country_alias")
+
+    stored_ids = {name: country_id for name, country_id in dimension.ids.items() if country_id not in dimension.pending}
+
+    df_alias = alias_table_to_dataframe(aliases)
+    df_alias["country_name"] = df_alias["country_name"].map(stored_ids).astype("UInt16")
+
+    bulk_insert_dataframe(storage, "country_alias", df_alias.dropna(subset=["country_name"]))
+
+    return None
+
+
+@profiled
+def resolve_country_names(names, aliases, matcher, source, cutoff=None):
+    """
+    This function returns the given country names replaced with the
+    names used in the population table.
+
+    Names of the population table are kept as they are and known
+    aliases are looked up in 'aliases'. Only the remaining names are
+    fuzzy matched, against the population names which no other name
+    of 'names' resolves to, so that two names never share a country.
+    A match scoring below 'cutoff' is not applied: the name is kept as
+    it is and logged to '<REJECT_DIR>/country_names.csv' for review
+    (a curated alias fixes it). The applied matches are added to
+    'aliases' for the next runs.
+
+    Input:
+        names: Pandas Series
+            all the country names of the dataset
+        aliases: dict
+            {alias_name: (country_name, source)}, updated in place
+        matcher: CountryMatcher
+            index over the population country names
+        source: string
+            name of the dataset, stored with the new aliases
+        cutoff: float in [0, 1]
+            default MATCH_CUTOFF
+
+    Return:
+        Pandas Series
+    """
+
+    cutoff = MATCH_CUTOFF if cutoff is None else cutoff
+    unique_names = names.dropna().unique()
+
+    resolved = {}
+
+    # country name -> name of the dataset resolved to it
+    claimed = {}
+
+    # (name, best match, source, reason) of the names kept as they are
+    unmatched = []
+
+    # The population names claim their own country first, then the known aliases
+    for name in unique_names:
+        if name in matcher.name_set:
+            resolved[name] = claimed[name] = name
+
+    for name in unique_names:
+        if name in resolved or name not in aliases:
+            continue
+
+        country_name = aliases[name][0]
+
+        if country_name in claimed:
+            resolved[name] = name
+            unmatched.append((name, country_name, source, "{} already resolves to {}".format(
+                claimed[country_name], country_name)))
+        else:
+            resolved[name] = country_name
+            claimed[country_name] = name
+
+    # Fuzzy match the other names against the unclaimed population names,
+    # the best scoring names claiming their country first
+    choices = matcher.name_set - set(claimed)
+    pending = [(name, (matcher.query(name, choices=choices) or [(None, 0.0)])[0])
+               for name in unique_names if name not in resolved]
+
+    for name, (country_name, score) in sorted(pending, key=lambda x: x[1][1], reverse=True):
+        if country_name in claimed:
+            country_name, score = (matcher.query(name, choices=choices) or [(None, 0.0)])[0]
+
+        if country_name is not None and score >= cutoff:
+            resolved[name] = country_name
+            claimed[country_name] = name
+            choices.discard(country_name)
+            aliases[name] = (country_name, source)
+        else:
+            resolved[name] = name
+            unmatched.append((name, country_name, source, "no match" if country_name is None else
+                              "match score {:.2f} is below {}".format(score, cutoff)))
+
+    if len(unmatched):
+        df_unmatched = pd.DataFrame(unmatched, columns=["alias_name", "country_name", "source", "reason"])
+        print("{}: {} country names kept unmatched, see {}".format(source, len(unmatched),
+                                                                   write_rejects("country_names", df_unmatched)))
+
+    return names.map(resolved)
+
+
+class CountryDimension:
+    """
+    Surrogate keys of the 'country' dimension table.
+
+    Every canonical country name gets a 2-byte 'country_id', which is
+    stored in the other tables instead of the name. The known ids are
+    read from the database once; the new names are validated against
+    the constraints of the 'country' table and get the next free ids.
+    A new country is written to the 'country' table by store(), only
+    when a valid row of another table refers to it.
+
+    Input:
+        storage: StorageBackend
+            connected to a database with the 'country' table
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+        rows = storage.query("SELECT country_id, country_name, iso_code FROM country")
+
+        self.ids = {name: country_id for country_id, name, _ in rows}
+        self.iso_codes = {country_id: iso_code for country_id, _, iso_code in rows}
+
+        # [country_name, iso_code] of the new countries not written yet, by id
+        self.pending = {}
+
+        # names rejected by the validation, which get no id
+        self.rejected = set()
+
+    def get_ids(self, names):
+        """
+        Return a Pandas Series (UInt16) with the country ids of the
+        Pandas Series 'names'. The names rejected by the validation of
+        the 'country' table (e.g. too long) have no id (missing value),
+        so the rows which refer to them are rejected as well.
+        """
+
+        new_names = [name for name in names.dropna().unique() if name not in self.ids and name not in self.rejected]
+
+        if len(new_names):
+            next_id = max(self.ids.values(), default=0) + 1
+            df_new = pd.DataFrame({"country_id": range(next_id, next_id + len(new_names)),
+                                   "country_name": new_names, "iso_code": None})
+
+            df_valid = reject_invalid_rows("country", df_new)
+            self.rejected.update(set(new_names) - set(df_valid["country_name"]))
+
+            for country_id, name in zip(df_valid["country_id"].tolist(), df_valid["country_name"].tolist()):
+                self.ids[name] = country_id
+                self.iso_codes[country_id] = None
+                self.pending[country_id] = [name, None]
+
+        return names.map(self.ids).astype("UInt16")
+
+    def store(self, country_ids):
+        """
+        Write the new countries of the given country ids (Pandas Series)
+        to the 'country' table, before the rows which refer to them.
+        """
+
+        new_ids = [country_id for country_id in country_ids.dropna().unique().tolist() if country_id in self.pending]
+
+        if len(new_ids):
+            df_new = pd.DataFrame([[country_id] + self.pending.pop(country_id) for country_id in new_ids],
+                                  columns=TABLE_COLUMNS["country"])
+            bulk_insert_dataframe(self.storage, "country", df_new, report=False, validate=False)
+
+        return None
+
+    def set_iso_codes(self, country_ids, iso_codes):
+        """
+        Store the ISO-3 codes of the given country ids (two Pandas Series)
+        which are not known yet. Codes of other lengths (e.g. "OWID_KOS")
+        are ignored.
+        """
+
+        df_iso = pd.DataFrame({"country_id": country_ids.to_numpy(), "iso_code": iso_codes.astype(object).to_numpy()})
+        df_iso = df_iso.dropna().drop_duplicates("country_id")
+        df_iso = df_iso[df_iso["iso_code"].str.len() == 3]
+
+        updates = [(iso_code, country_id) for country_id, iso_code in \
+                   zip(df_iso["country_id"].tolist(), df_iso["iso_code"].tolist()) \
+                   if self.iso_codes.get(country_id) != iso_code]
+
+        # The codes of the countries not written yet are written with them
+        for iso_code, country_id in updates:
+            if country_id in self.pending:
+                self.pending[country_id][1] = iso_code
+
+        stored_updates = [update for update in updates if update[1] not in self.pending]
+
+        if len(stored_updates):
+            self.storage.executemany("UPDATE country SET iso_code = %s WHERE country_id = %s", stored_updates)
+            self.storage.commit()
+
+        self.iso_codes.update((country_id, iso_code) for iso_code, country_id in updates)
+
+        return None
+
+
+def get_close_matches(name, list_compare, pad=True, matcher=None):
     
     """
     This function returns the best matching entry
@@ -128,18 +865,20 @@ def get_close_matches(name, list_compare, pad=True):
     Input:
         name: string
         list_compare: [string]
+        matcher: CountryMatcher
+            prebuilt index to use for the lookup (optional)
         
     """
-    from difflib import get_close_matches
-    match_list = get_close_matches(name, list_compare, n=1, cutoff=0.5)
-    
-    if len(match_list):
-        return match_list[0]
-    else:
-        return name if pad else None
 
+    if matcher is None:
+        matcher = CountryMatcher(list_compare)
+        return matcher.best_match(name, pad)
+
+    return matcher.best_match(name, pad, choices=set(list_compare))
 
-def find_divergence(df_pop, df, col_name):
+
+@profiled
+def find_divergence(df_pop, df, col_name, matcher=None):
     """
     This function adds "CnT-pad" and "CnT-noPad" and
     returns the records with non-matching country names
@@ -148,6 +887,8 @@ def find_divergence(df_pop, df, col_name):
     Input:
         df: Pandas DataFrame
         col_name: string
+        matcher: CountryMatcher
+            index over the names of df_pop, built here if not given
     
     Return:
         Pandas DataFrame
@@ -155,6 +896,9 @@ def find_divergence(df_pop, df, col_name):
     """
     df_2 = df.copy()
 
+    if matcher is None:
+        matcher = CountryMatcher(df_pop["name"])
+
     # merge tables
     df_merge_unmatch = filter_unmatched_index(df_pop, df_2,"name", col_name)
 
@@ -163,41 +907,25 @@ def find_divergence(df_pop, df, col_name):
     primary = df_merge_unmatch[col_name].dropna()
     options = df_merge_unmatch["name"].dropna()
 
+    # Add column 'CnT-noPad' to "df_merge_unmatch" which has None when there is no good match
+    no_pad = matcher.match_series(primary, pad=False, choices=options)
+    df_merge_unmatch["CnT-noPad"] = no_pad
+
     # Add column 'CnT-pad' to "df_merge_unmatch" with either the best match from options (if any)
     # or the primary/self (if there is no good match)
-    df_merge_unmatch["CnT-pad"] = primary.apply(lambda country: get_close_matches(country, options))
-
-    # Add column 'CnT-noPad' to "df_merge_unmatch" which has None when there is no good match
-    df_merge_unmatch["CnT-noPad"] = primary.apply(lambda country: get_close_matches(country, options, pad=False))
+    df_merge_unmatch["CnT-pad"] = no_pad.fillna(primary)
 
     return df_merge_unmatch[["index_primary", "name", "index_ancillary", col_name,"CnT-pad","CnT-noPad"]]
 
 
 
-def main():
+def clean_tokyo(df_tokyo):
     """
-    This functions imports all the datasets into pandas dataframe,
-    cleans the data and stores in a SQL database.
+    Basic cleaning of the Tokyo_Medals_2020.csv dataset.
     """
 
-    # full path where data files are stored
-    dir_path = input("Enter the directory where data files are stored: " )
-
-    # Import all the datasets
-
-    df_tokyo = pd.read_csv(path.join(dir_path,"Tokyo_Medals_2020.csv"), header=0)
-    df_rio = pd.read_csv(path.join(dir_path,"Rio_Medals_2016.csv"), header=0)
-    df_london = pd.read_csv(path.join(dir_path,"London_Medals_2012.csv"), header=0)
-    df_population = pd.read_csv(path.join(dir_path,"Population_2020-21.csv"), header= 0)
-    df_covid_vac = pd.read_csv(path.join(dir_path,"Covid_Vaccination_Data.csv"), header= 0)
-    df_gdp = pd.read_csv(path.join(dir_path,"GDP_Actual_Value.csv"), header= 0, encoding="ISO-8859-1")
-
-
-    # Part-I of Data Pre-processing
-
-    # Basic cleaning of df_tokyo
     # Drop 'Rank By Total' column
-    df_tokyo = df_tokyo.drop(columns="Rank By Total", axis=1)
+    df_tokyo = df_tokyo.drop(columns="Rank By Total")
 
     # Fix column names of the dataframe
     fix_column_name(df_tokyo)
@@ -205,10 +933,16 @@ def main():
     # Clean the country names
     df_tokyo = normalize_country_names(df_tokyo, "Country")
 
+    return df_tokyo
 
-    # Basic cleaning of df_rio
-    # Add column "Total"
-    df_rio["Total"] = df_rio.iloc[:,1:3].sum(axis=1)
+
+def clean_rio(df_rio):
+    """
+    Basic cleaning of the Rio_Medals_2016.csv dataset.
+    """
+
+    # Add column "Total" (Gold + Silver + Bronze)
+    df_rio["Total"] = df_rio.iloc[:,1:4].sum(axis=1)
 
     # Fix column names of the dataframe
     fix_column_name(df_rio)
@@ -216,60 +950,81 @@ def main():
     # Clean the country names
     df_rio = normalize_country_names(df_rio, "Country")
 
+    return df_rio
+
+
+def clean_london(df_london):
+    """
+    Basic cleaning of the London_Medals_2012.csv dataset.
+    """
 
-    # Basic cleaning of df_london
     # Fix column names of the dataframe
     fix_column_name(df_london)
 
     # Clean the country names
     df_london = normalize_country_names(df_london, "Country")
 
+    return df_london
 
-    # Basic cleaning of df_population
-    # Drop non-essential columns
-    df_population = df_population[["name","pop2021","pop2020"]]
+
+def clean_medals(df_medals):
+    """
+    Basic cleaning of the medals dataset of any other Olympic Games
+    edition, with a 'Country' column, 'Gold', 'Silver' and 'Bronze'
+    medal count columns and an optional 'Total' column.
+    """
+
+    # Find the medal count columns, in the column order of the database table
+    medal_cols = [next(col for col in df_medals.columns if col.startswith(medal))
+                  for medal in ["Gold", "Silver", "Bronze"]]
+    total_cols = [col for col in df_medals.columns if col.startswith("Total")][:1]
+
+    df_medals = df_medals[["Country"] + medal_cols + total_cols].copy()
+
+    # Add column "Total"
+    if not total_cols:
+        df_medals["Total"] = df_medals[medal_cols].sum(axis=1)
 
     # Fix column names of the dataframe
-    fix_column_name(df_population)
+    fix_column_name(df_medals)
 
     # Clean the country names
-    df_population = normalize_country_names(df_population, "name")
+    df_medals = normalize_country_names(df_medals, "Country")
 
-    # Rectify population values
-    df_population['pop2021'] = df_population['pop2021'].apply(lambda x : x * 1000)
-    df_population['pop2020'] = df_population['pop2020'].apply(lambda x : x * 1000)
+    return df_medals
 
 
-    # Basic cleaning of df_covid_vac
-    # Drop unncessary columns
-    df_covid_vac = df_covid_vac[["location", "date", "total_cases", "new_cases", \
-            "total_deaths", "new_deaths", "people_vaccinated", "people_fully_vaccinated"]]
+def clean_population(df_population):
+    """
+    Basic cleaning of the Population_2020-21.csv dataset.
+    """
 
-    # Remove non-country entries
-    to_remove = ["Africa", "Asia", "Europe", "European Union", "High income", \
-            "International", "Low income", "Lower middle income", \
-            "North America", "Oceania","South America", "Upper middle income","World"]
+    # Drop non-essential columns, in the column order of the database table
+    df_population = df_population[["name","pop2020","pop2021"]].copy()
 
-    for name in to_remove:
-        df_covid_vac.drop(df_covid_vac[df_covid_vac['location'] == name].index, inplace = True)
+    # Fix column names of the dataframe
+    fix_column_name(df_population)
 
+    # Clean the country names
+    df_population = normalize_country_names(df_population, "name")
 
-    # Fix column names of the dataframe
-    fix_column_name(df_covid_vac)
+    # Rectify population values, stored as uint32 when they all fit
+    df_population['pop2021'] = (df_population['pop2021'] * 1000).round()
+    df_population['pop2020'] = (df_population['pop2020'] * 1000).round()
 
-    # Replace NaN values with 0
-    df_covid_vac.fillna(value=0, inplace=True)
+    return narrow_dtypes(df_population, {"pop2020": "uint32", "pop2021": "uint32"})
 
-    # Clean the country names
-    df_covid_vac = normalize_country_names(df_covid_vac, "location")
 
+def clean_gdp(df_gdp):
+    """
+    Basic cleaning of the GDP_Actual_Value.csv dataset.
+    """
 
-    # Basic cleaning of df_gdp
     # Rename country name column
     df_gdp.rename(columns={"GDP, current prices (Billions of U.S. dollars)": "Country"}, inplace=True)
 
     # Drop non-essential columns
-    df_gdp = df_gdp[["Country","2012","2013","2014","2015","2016","2017","2018","2019","2020","2021"]]
+    df_gdp = df_gdp[["Country","2012","2013","2014","2015","2016","2017","2018","2019","2020","2021"]].copy()
 
     # Fix column names of the dataframe
     fix_column_name(df_gdp)
@@ -280,288 +1035,997 @@ def main():
     # Remove entries of different regions other than country
     df_gdp.drop(df_gdp.index[197:228], axis=0, inplace=True)
 
-    # Replace 'no data' entries with 0
-    df_gdp.replace(['no data'], [0], inplace=True)
+    # Replace 'no data' entries (parsed as missing values) with 0
+    df_gdp = df_gdp.fillna({col: 0 for col in df_gdp.columns[1:]})
 
     # Clean the country names
     df_gdp = normalize_country_names(df_gdp, "Country")
 
+    return df_gdp
 
-    # Part-II of Data Pre-processing
 
-    # for df_tokyo
-    df_tmp = find_divergence(df_population, df_tokyo, df_tokyo.columns[0])
+def file_content_hash(file_path):
+    """
+    Return the SHA-256 hex digest of the content of a file.
+    """
 
-    # Copy the 'CnT-pad' column and then fix wrong values manually
-    df_tmp["pop_fixed"] = df_tmp["CnT-pad"].copy()
+    digest = sha256()
 
-    df_tmp.loc[232, 'pop_fixed'] = "Ivory Coast"
-    df_tmp.loc[234, 'pop_fixed'] = "United Kingdom"
-    df_tmp.loc[236, 'pop_fixed'] = "Iran"
-    df_tmp.loc[238, 'pop_fixed'] = "China"
-    df_tmp.loc[239, 'pop_fixed'] = "South Korea"
-    df_tmp.loc[240, 'pop_fixed'] = "Moldova"
-    df_tmp.loc[241, 'pop_fixed'] = "Russia"
-    df_tmp.loc[242, 'pop_fixed'] = "Syria"
-    df_tmp.loc[233, 'pop_fixed'] = "Taiwan"
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
 
-    # Now put the obtained values back into the df_2 data frame with the correct indexes
-    index_tmp = df_tmp['index_ancillary'].dropna().astype(int)
-    names_tmp = df_tmp['pop_fixed'].dropna().values
-    df_tokyo.loc[index_tmp, df_tokyo.columns[0]] = names_tmp
+    return digest.hexdigest()
 
-    del df_tmp
 
+@profiled
+def read_cached_frame(cache_dir, name, key):
+    """
+    This function returns the cached DataFrame of the dataset 'name'
+    stored under 'key', or None if there is no such cache entry.
+    """
 
-    # for df_rio
-    df_tmp = find_divergence(df_population, df_rio, df_rio.columns[0])
+    file_path = path.join(cache_dir, "{}-{}.{}".format(name, key, CACHE_FORMAT))
 
-    # Copy the 'CnT-pad' column and then fix wrong values manually
-    df_tmp["pop_fixed"] = df_tmp["CnT-pad"].copy()
+    if not path.exists(file_path):
+        return None
 
-    df_tmp.loc[232, 'pop_fixed'] = "Ivory Coast"
+    if CACHE_FORMAT == "parquet":
+        return pd.read_parquet(file_path)
+    else:
+        return pd.read_pickle(file_path)
 
-    # Now put the obtained values back into the df_2 data frame with the correct indexes
-    index_tmp = df_tmp['index_ancillary'].dropna().astype(int)
-    names_tmp = df_tmp['pop_fixed'].dropna().values
-    df_rio.loc[index_tmp, df_rio.columns[0]] = names_tmp
 
-    del df_tmp
+def write_cached_frame(cache_dir, name, key, df):
+    """
+    This function stores the DataFrame of the dataset 'name' in the
+    cache under 'key' and evicts the stale entries of the dataset.
+    """
 
+    makedirs(cache_dir, exist_ok=True)
+    file_path = path.join(cache_dir, "{}-{}.{}".format(name, key, CACHE_FORMAT))
 
+    # Remove the entries of older file contents or cleaning versions
+    for old_file in glob(path.join(cache_dir, "{}-*.*".format(name))):
+        if old_file != file_path:
+            remove(old_file)
 
-    # for df_london
-    df_tmp = find_divergence(df_population, df_london, df_london.columns[0])
+    if CACHE_FORMAT == "parquet":
+        df.to_parquet(file_path)
+    else:
+        df.to_pickle(file_path)
 
-    # Copy the 'CnT-pad' column and then fix wrong values manually
-    df_tmp["pop_fixed"] = df_tmp["CnT-pad"].copy()
+    return None
 
-    df_tmp.loc[232, 'pop_fixed'] = "Taiwan"
-    df_tmp.loc[233, 'pop_fixed'] = "North Korea"
-    df_tmp.loc[234, 'pop_fixed'] = "United Kingdom"
-    df_tmp.loc[236, 'pop_fixed'] = "Iran"
-    df_tmp.loc[237, 'pop_fixed'] = "China"
-    df_tmp.loc[238, 'pop_fixed'] = "South Korea"
 
-    # Now put the obtained values back into the df_2 data frame with the correct indexes
-    index_tmp = df_tmp['index_ancillary'].dropna().astype(int)
-    names_tmp = df_tmp['pop_fixed'].dropna().values
-    df_london.loc[index_tmp, df_london.columns[0]] = names_tmp
+@profiled
+def read_source(name, file_path, **kwargs):
+    """
+    This function reads the columns of the dataset 'name' listed
+    in DTYPE_SCHEMA with their compact dtypes.
 
-    del df_tmp
+    Input:
+        name: string
+            key of DTYPE_SCHEMA
+        file_path: string
+        kwargs:
+            extra arguments of pd.read_csv (e.g. nrows, chunksize)
 
+    Return:
+        Pandas DataFrame (or TextFileReader with 'chunksize')
+    """
 
-    # for df_covid_vac
-    df = pd.DataFrame(df_covid_vac.location.unique(), columns=["Country_Name"])
-    df_tmp = find_divergence(df_population, df, df.columns[0])
+    schema = DTYPE_SCHEMA[name]
 
-    # Copy the 'CnT-pad' column and then fix wrong values manually
-    df_tmp["pop_fixed"] = df_tmp["CnT-pad"].copy()
+    # datetime columns are parsed with 'parse_dates'
+    dtypes = {col: dtype for col, dtype in schema.items() if not dtype.startswith("datetime64")}
+    parse_dates = [col for col in schema if col not in dtypes]
 
-    df_tmp.loc[233, 'pop_fixed'] = "Republic of the Congo"
-    df_tmp.loc[234, 'pop_fixed'] = "Ivory Coast"
-    df_tmp.loc[236, 'pop_fixed'] = "DR Congo"
-    df_tmp.loc[242, 'pop_fixed'] = "Northern Cyprus"
-    df_tmp.loc[244, 'pop_fixed'] = "Saint Helena"
+    return pd.read_csv(file_path, header=0, usecols=list(schema), dtype=dtypes, parse_dates=parse_dates,
+                       **READ_OPTIONS.get(name, {}), **kwargs)
 
 
-    # Now put the obtained values back into the df_2 data frame with the correct indexes
-    index_tmp = df_tmp['index_ancillary'].dropna().astype(int)
-    names_tmp = df_tmp['pop_fixed'].dropna().values
-    df.loc[index_tmp, df.columns[0]] = names_tmp
+def memory_report(dir_path, nrows=None):
+    """
+    This function returns the memory used by the first 'nrows' rows
+    of every dataset when it is parsed with the default dtypes and
+    when it is parsed with DTYPE_SCHEMA. Only the string columns are
+    smaller at this point, the counters are narrowed after validation.
 
+    Input:
+        dir_path: string
+            directory where data files are stored
+        nrows: int
+            default MEMORY_REPORT_ROWS
 
-    old_val = ["Congo", "Cote d'Ivoire", "Democratic Republic of Congo"]
-    new_val = ["Republic of the Congo", "Ivory Coast", "DR Congo"]
+    Return:
+        Pandas DataFrame with the bytes 'before' and 'after' per dataset
+    """
 
-    df_covid_vac['location'] =  df_covid_vac['location'].replace(old_val,new_val)
+    nrows = nrows or MEMORY_REPORT_ROWS
+    files = dict(SOURCE_FILES, covid=COVID_VAC_FILE)
+    report = []
 
+    for name, file_name in files.items():
+        file_path = path.join(dir_path, file_name)
+        encoding = READ_OPTIONS.get(name, {}).get("encoding")
 
-    del df, df_tmp
+        df_before = pd.read_csv(file_path, header=0, nrows=nrows, encoding=encoding)
+        df_after = read_source(name, file_path, nrows=nrows)
 
+        report.append((name, df_before.memory_usage(deep=True).sum(), df_after.memory_usage(deep=True).sum()))
 
+    df_report = pd.DataFrame(report, columns=["dataset", "before", "after"]).set_index("dataset")
+    df_report["ratio"] = (df_report["before"] / df_report["after"]).round(1)
 
-    # for df_gdp
-    df_tmp = find_divergence(df_population, df_gdp, df_gdp.columns[0])
+    return df_report
 
-    # Copy the 'CnT-pad' column and then fix wrong values manually
-    df_tmp["pop_fixed"] = df_tmp["CnT-pad"].copy()
 
-    df_tmp.loc[235, 'pop_fixed'] = 'China'
-    df_tmp.loc[236, 'pop_fixed'] = "DR Congo"
-    df_tmp.loc[238, 'pop_fixed'] = "Ivory Coast"
-    df_tmp.loc[241, 'pop_fixed'] = "South Korea"
-    df_tmp.loc[243, 'pop_fixed'] = 'Kyrgyzstan'
-    df_tmp.loc[244, 'pop_fixed'] = 'Laos'
-    df_tmp.loc[252, 'pop_fixed'] = "Taiwan"
+@profiled
+def clean_source(name, df):
+    """
+    This function returns the dataset 'name' of SOURCE_FILES after
+    the basic cleaning (Part-I of Data Pre-processing).
 
-    df_tmp.loc[253, 'pop_fixed'] = "West Bank and Gaza"
-    df_tmp.loc[254, 'pop_fixed'] = "Africa"
+    Input:
+        name: string
+            key of SOURCE_FILES
+        df: Pandas DataFrame
+            see read_source()
 
-    # Now put the obtained values back into the df_2 table with the correct indexes
-    index_tmp = df_tmp['index_ancillary'].dropna().astype(int)
-    names_tmp = df_tmp['pop_fixed'].dropna().values
-    df_gdp.loc[index_tmp, df_gdp.columns[0]] = names_tmp
+    Return:
+        Pandas DataFrame
+    """
 
-    del df_tmp
+    # the medals datasets of the other Olympic Games editions have no specific cleaning
+    clean_func = {"tokyo": clean_tokyo, "rio": clean_rio, "london": clean_london,
+                  "population": clean_population, "gdp": clean_gdp}.get(name, clean_medals)
 
+    return clean_func(df)
 
-    # Store the datasets in a SQL database server
 
-    # Connect and login into MySQL database server
-    connection = mysql.connector.connect(user=input("Enter username: "), password=getpass("Enter password: "))
-    cursor = connection.cursor()
+@profiled
+def load_source(name, dir_path, use_cache=None):
+    """
+    This function reads one of the datasets in SOURCE_FILES and
+    returns it after the basic cleaning (Part-I of Data Pre-processing).
+    It is run as an independent task on the process pool of main().
 
-    # Create and select database
-    create_db_query = "CREATE DATABASE IF NOT EXISTS olympic"
-    cursor.execute(create_db_query)
+    The cleaned dataset is cached as a Parquet file (pickle if pyarrow
+    is not installed). The cache key is the hash of the file content
+    and CLEANING_VERSION, so an unchanged file is not parsed again.
 
-    select_db_query = "use olympic"
-    cursor.execute(select_db_query)
+    Input:
+        name: string
+            key of SOURCE_FILES
+        dir_path: string
+            directory where data files are stored
+        use_cache: bool
+            default USE_CACHE
 
-    # Create Tables
-    tables_def = {
-        "tokyo_olympic_2020" : """
-                                CREATE TABLE IF NOT EXISTS tokyo_olympic_2020 (
-                                    country_name VARCHAR(60) NOT NULL,
-                                    gold_medals INT NOT NULL,
-                                    silver_medals INT NOT NULL,
-                                    bronze_medals INT NOT NULL,
-                                    total_medals INT NOT NULL,
+    Return:
+        Pandas DataFrame
+    """
 
-                                    CONSTRAINT uniq_constraint UNIQUE(country_name)
-                                )
-                            """,
+    use_cache = USE_CACHE if use_cache is None else use_cache
+    file_path = path.join(dir_path, SOURCE_FILES[name])
 
+    if use_cache:
+        cache_dir = CACHE_DIR or path.join(dir_path, ".cache")
+        key = "{}-v{}".format(file_content_hash(file_path)[:16], CLEANING_VERSION)
 
-        "rio_olympic_2016" : """
-                                CREATE TABLE IF NOT EXISTS rio_olympic_2016 (
-                                    country_name VARCHAR(60) NOT NULL,
-                                    gold_medals INT NOT NULL,
-                                    silver_medals INT NOT NULL,
-                                    bronze_medals INT NOT NULL,
-                                    total_medals INT NOT NULL,
+        df = read_cached_frame(cache_dir, name, key)
 
-                                    CONSTRAINT uniq_constraint UNIQUE(country_name)
-                                )
-                        """,
+        if df is not None:
+            return df
 
-        "london_olympic_2012" : """
-                                CREATE TABLE IF NOT EXISTS london_olympic_2012 (
-                                    country_name VARCHAR(60) NOT NULL,
-                                    gold_medals INT NOT NULL,
-                                    silver_medals INT NOT NULL,
-                                    bronze_medals INT NOT NULL,
-                                    total_medals INT NOT NULL,
-                                    
-                                    CONSTRAINT uniq_constraint UNIQUE(country_name)
-                                )
-                                """,
-
-        "population" : """
-                        CREATE TABLE IF NOT EXISTS population (
-                            country_name VARCHAR(60) NOT NULL,
-                            pop_2020 INT UNSIGNED NOT NULL,
-                            pop_2021 INT UNSIGNED NOT NULL,
-                            
-                            CONSTRAINT uniq_constraint UNIQUE(country_name)
-                        )
-                    """,
+    df = clean_source(name, read_source(name, file_path))
 
-        "covid_and_vac" : """
-                            CREATE TABLE IF NOT EXISTS covid_and_vac (
-                                country_name VARCHAR(60) NOT NULL,
-                                date_reported DATE NOT NULL,
-                                cumulative_cases INT UNSIGNED NOT NULL,
-                                new_cases INT NOT NULL,
-                                cumulative_deaths INT UNSIGNED NOT NULL,
-                                new_deaths INT NOT NULL,
-                                people_vaccinated INT UNSIGNED NOT NULL,
-                                people_fully_vaccinated INT UNSIGNED NOT NULL,
-                                
-                                
-                                CONSTRAINT uniq_constraint UNIQUE(country_name, date_reported)
-                            )
-                        """,
+    if use_cache:
+        write_cached_frame(cache_dir, name, key, df)
 
-        "gdp_value" : """
-                        CREATE TABLE IF NOT EXISTS gdp_value (
-                            country_name VARCHAR(60) NOT NULL,
-                            gdp_2012 FLOAT NOT NULL,
-                            gdp_2013 FLOAT NOT NULL,
-                            gdp_2014 FLOAT NOT NULL,
-                            gdp_2015 FLOAT NOT NULL,
-                            gdp_2016 FLOAT NOT NULL,
-                            gdp_2017 FLOAT NOT NULL,
-                            gdp_2018 FLOAT NOT NULL,
-                            gdp_2019 FLOAT NOT NULL,
-                            gdp_2020 FLOAT NOT NULL,
-                            gdp_2021 FLOAT NOT NULL,
-                            
-                            CONSTRAINT uniq_constraint UNIQUE(country_name)
-                        )
-                    """
-        }
+    return df
 
-    # Create all the tables in the database
-    for query in tables_def.values():
-        cursor.execute(query)
 
-    
-    # Write data into the database
-    for i, row in df_tokyo.iterrows():
-        sql = "INSERT INTO tokyo_olympic_2020 (country_name, gold_medals, silver_medals, \
-            bronze_medals, total_medals) VALUES (%s,%s,%s,%s,%s)"
-        
-        cursor.execute(sql,tuple(row))
-        
-        connection.commit()
-    
-    for i, row in df_rio.iterrows():
-        sql = "INSERT INTO rio_olympic_2016 (country_name, gold_medals, silver_medals, \
-            bronze_medals, total_medals) VALUES (%s,%s,%s,%s,%s)"
+def read_covid_vac_names(file_path):
+    """
+    This function returns the distinct country names of the
+    Covid_Vaccination_Data.csv file, normalized and without the
+    non-country entries. Only the 'location' column is parsed.
 
-        cursor.execute(sql,tuple(row))
+    Input:
+        file_path: string
 
-        connection.commit()
+    Return:
+        Pandas Series
+    """
 
-    for i, row in df_london.iterrows():
-        sql = "INSERT INTO london_olympic_2012 (country_name, gold_medals, silver_medals, \
-            bronze_medals, total_medals) VALUES (%s,%s,%s,%s,%s)"
+    locations = pd.read_csv(file_path, header=0, usecols=["location"], dtype="category")["location"]
+    names = [normalize_country_name(name) for name in locations.cat.categories if name not in NON_COUNTRY_LOCATIONS]
 
-        cursor.execute(sql,tuple(row))
+    return pd.Series(names, dtype=object).drop_duplicates()
 
-        connection.commit()
-    
-    for i, row in df_population.iterrows():
-        sql = "INSERT INTO population (country_name, pop_2020, pop_2021) VALUES (%s,%s,%s)"
 
-        cursor.execute(sql,tuple(row))
+@profiled
+def clean_covid_vac_chunk(df_covid_vac, country_names=None):
+    """
+    This function cleans one chunk of the Covid_Vaccination_Data.csv
+    file: removes the non-country entries, fixes the column names,
+    replaces the missing values with 0 and cleans the country names.
+    The counters keep the wide dtypes of DTYPE_SCHEMA.
+
+    Input:
+        df_covid_vac: Pandas DataFrame
+        country_names: dict
+            {normalized name: population name} of all the names of
+            the file, see stream_covid_vac()
+            None: the country names are only normalized
+
+    Return:
+        Pandas DataFrame
+    """
 
-        connection.commit()
+    # Remove non-country entries
+    df_covid_vac = df_covid_vac[~df_covid_vac["location"].isin(NON_COUNTRY_LOCATIONS)]
 
-    for i, row in df_covid_vac.iterrows():
-        sql = "INSERT INTO covid_and_vac (country_name, date_reported, cumulative_cases, new_cases, \
-            cumulative_deaths, new_deaths, people_vaccinated, people_fully_vaccinated) \
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)"
+    # Fix column names of the dataframe
+    fix_column_name(df_covid_vac)
 
-        cursor.execute(sql,tuple(row))
+    # Replace NaN values with 0. The counters keep their parsed dtypes until
+    # the chunk is validated (see stream_covid_vac)
+    df_covid_vac = df_covid_vac.fillna({col: 0 for col in COVID_VAC_STORAGE_DTYPES})
 
-        connection.commit()
-    
-    for i, row in df_gdp.iterrows():
-        sql = "INSERT INTO gdp_value (country_name, gdp_2012, gdp_2013, gdp_2014, \
-            gdp_2015, gdp_2016, gdp_2017, gdp_2018, gdp_2019, gdp_2020, gdp_2021) \
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
+    # Clean the country names
+    df_covid_vac = normalize_country_names(df_covid_vac, "location")
+
+    if country_names is not None:
+        df_covid_vac["location"] = df_covid_vac["location"].map(country_names)
+
+    return df_covid_vac
+
+
+def read_covid_vac_chunks(file_path, country_names, chunksize=None, skip_until=None):
+    """
+    This function reads the Covid_Vaccination_Data.csv file in chunks
+    of 'chunksize' rows, parsing only the columns in DTYPE_SCHEMA,
+    and yields every chunk after cleaning. Only one chunk is held in
+    memory at a time.
+
+    With 'skip_until', the chunks whose rows are all reported on or
+    before that date are parsed but not cleaned nor yielded.
+
+    Input:
+        file_path: string
+        country_names: dict
+            see clean_covid_vac_chunk()
+        chunksize: int
+            number of rows per chunk, default CHUNK_SIZE
+        skip_until: Pandas Timestamp
+
+    Return:
+        generator of Pandas DataFrame
+    """
+
+    reader = read_source("covid", file_path, chunksize=chunksize or CHUNK_SIZE)
+
+    with reader:
+        while True:
+            # parse the next chunk
+            with PROFILER.stage("read_chunk") as stage:
+                df_chunk = next(reader, None)
+                stage["rows"] = None if df_chunk is None else len(df_chunk)
+
+            if df_chunk is None:
+                break
+
+            if skip_until is not None and df_chunk["date"].max() <= skip_until:
+                continue
+
+            # keep the column order of the database table
+            yield clean_covid_vac_chunk(df_chunk[list(DTYPE_SCHEMA["covid"])], country_names)
+
+
+def dataframe_to_records(df):
+    """
+    This function converts the rows of the given DataFrame into
+    a list of tuples of plain Python values which can be passed
+    to the database connector.
+
+    Input:
+        df: Pandas DataFrame
+
+    Return:
+        list[tuple]
+    """
+
+    columns = []
+
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            columns.append(df[col].dt.date.tolist())
+        else:
+            columns.append(df[col].astype(object).tolist())
+
+    return list(zip(*columns))
+
+
+def parse_table_definition(query):
+    """
+    This function returns the constraints of the columns of a
+    CREATE TABLE query and its unique keys.
+
+    Input:
+        query: string
+            one of TABLES_DEF
+
+    Return:
+        dict: {column: (type, length, unsigned, not null)}
+        list[list[strings]]: columns of every unique key
+    """
+
+    columns = {match.group(1): (match.group(2), int(match.group(3)) if match.group(3) else None,
+                                bool(match.group(4)), bool(match.group(5)))
+               for match in COLUMN_DEF_REGEX.finditer(query)
+               if match.group(1) not in ["CREATE", "PRIMARY", "CONSTRAINT", "FOREIGN"]}
+
+    unique_keys = [[col.strip() for col in cols.split(",")] for cols in UNIQUE_KEY_REGEX.findall(query)]
+
+    return columns, unique_keys
+
+
+def integer_range(col_type, unsigned):
+    """
+    Return the minimum and maximum values of an integer column type.
+    """
+
+    bits = INTEGER_TYPE_BITS[col_type]
+
+    return (0, 2 ** bits - 1) if unsigned else (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+
+
+def validate_dataframe(table_name, df, upsert=False):
+    """
+    This function checks all the rows of the given DataFrame at once
+    against the constraints of the definition of the table, column by
+    column: missing values in NOT NULL columns, negative values in
+    UNSIGNED columns, integers out of the range of the column type,
+    non-finite floats, strings longer than the VARCHAR/CHAR length and
+    duplicate keys of the unique constraints (the last row of a key is
+    kept with 'upsert', the first one otherwise).
+
+    Input:
+        table_name: string
+            one of the tables in TABLE_COLUMNS
+        df: Pandas DataFrame
+            columns in the same order as TABLE_COLUMNS[table_name]
+        upsert: bool
+            see bulk_insert_dataframe()
+
+    Return:
+        Pandas DataFrame: the valid rows ('df' itself when all the rows are valid)
+        Pandas DataFrame: the rejected rows, with the column names of the
+            table and a 'reason' column
+    """
+
+    columns, unique_keys = parse_table_definition(TABLES_DEF[table_name])
+    column_names = TABLE_COLUMNS[table_name]
+
+    # (boolean NumPy mask of the rows, reason) of every violated constraint
+    violations = []
+
+    def check(mask, reason):
+        mask = mask.fillna(False).to_numpy(dtype=bool)
+
+        if mask.any():
+            violations.append((mask, reason))
+
+    for position, col in enumerate(column_names):
+        col_type, length, unsigned, not_null = columns[col]
+        values = df.iloc[:, position]
+        missing = values.isna()
+
+        if not_null:
+            check(missing, "{} is missing".format(col))
+
+        if col_type in INTEGER_TYPE_BITS:
+            low, high = integer_range(col_type, unsigned)
+
+            # The range is checked whatever the dtype: a dtype within the range
+            # of the column type may hold a value wrapped by a narrow parse
+            if not pd.api.types.is_integer_dtype(values.dtype):
+                values = pd.to_numeric(values, errors="coerce").astype("float64")
+
+                check(values.isna() & ~missing, "{} is not a number".format(col))
+                check((values % 1 != 0) & values.notna(), "{} is not an integer".format(col))
+
+            check(values < low, "{} is negative".format(col) if unsigned else
+                  "{} is below the range of {}".format(col, col_type))
+            check(values > high, "{} is above the range of {}{}".format(col, col_type,
+                                                                       " UNSIGNED" if unsigned else ""))
+
+        elif col_type in ["FLOAT", "DOUBLE"] and pd.api.types.is_float_dtype(values.dtype):
+            check(values.abs() == np.inf, "{} is not finite".format(col))
+
+        elif col_type in ["VARCHAR", "CHAR"]:
+            check(values.astype("string").str.len() > length,
+                  "{} is longer than {} characters".format(col, length))
+
+    invalid = np.zeros(len(df), dtype=bool)
+
+    for mask, _ in violations:
+        invalid |= mask
+
+    # Duplicate keys among the other valid rows
+    for key in unique_keys:
+        positions = [column_names.index(col) for col in key]
+        duplicated = np.zeros(len(df), dtype=bool)
+        duplicated[~invalid] = df.iloc[~invalid, positions].duplicated(keep="last" if upsert else "first")
+
+        if duplicated.any():
+            violations.append((duplicated, "duplicate key ({})".format(", ".join(key))))
+            invalid |= duplicated
+
+    if not invalid.any():
+        return df, df.iloc[:0].set_axis(column_names, axis=1).assign(reason=pd.Series(dtype=object))
+
+    # Reasons of the rejected rows only
+    reasons = np.full(invalid.sum(), "", dtype=object)
+
+    for mask, reason in violations:
+        rows = mask[invalid]
+        reasons[rows] = reasons[rows] + reason + "; "
+
+    df_rejects = df[invalid].set_axis(column_names, axis=1).assign(reason=[reason[:-2] for reason in reasons])
+
+    return df[~invalid], df_rejects
+
+
+def write_rejects(table_name, df_rejects, reject_dir=None):
+    """
+    This function appends the rejected rows of a table, with the
+    reasons and the time of the load, to '<reject_dir>/<table_name>.csv'.
+
+    Input:
+        table_name: string
+        df_rejects: Pandas DataFrame
+            see validate_dataframe()
+        reject_dir: string
+            default REJECT_DIR
+
+    Return:
+        string: path of the reject file
+    """
+
+    reject_dir = reject_dir or REJECT_DIR
+    file_path = path.join(reject_dir, "{}.csv".format(table_name))
+
+    makedirs(reject_dir, exist_ok=True)
+
+    df_rejects = df_rejects.copy()
+    df_rejects.insert(0, "rejected_at", pd.Timestamp.now().isoformat(timespec="seconds"))
+    df_rejects.to_csv(file_path, mode="a", header=not path.exists(file_path), index=False,
+                      date_format="%Y-%m-%d")
+
+    return file_path
+
+
+@profiled
+def reject_invalid_rows(table_name, df, upsert=False):
+    """
+    This function returns the rows of the given DataFrame which satisfy
+    the constraints of the table (see validate_dataframe) and appends
+    the other rows to the reject file of the table.
+
+    Input:
+        table_name: string
+            one of the tables in TABLE_COLUMNS
+        df: Pandas DataFrame
+            columns in the same order as TABLE_COLUMNS[table_name]
+        upsert: bool
+            see bulk_insert_dataframe()
+
+    Return:
+        Pandas DataFrame
+    """
+
+    df, df_rejects = validate_dataframe(table_name, df, upsert)
+
+    if len(df_rejects):
+        print("{}: {} rows rejected, see {}".format(table_name, len(df_rejects),
+                                                    write_rejects(table_name, df_rejects)))
+
+    return df
+
+
+@profiled
+def bulk_insert_dataframe(storage, table_name, df, batch_size=None, use_load_data=None, report=True,
+                          upsert=False, validate=None, dimension=None):
+    """
+    This function writes all the rows of the given DataFrame into
+    the given table. The rows are sent with multi-row INSERTs of
+    'batch_size' rows (or a single "LOAD DATA LOCAL INFILE" from a
+    temporary CSV file, or a single frame insert on the backends which
+    support it, see StorageBackend.insert_dataframe) and committed once
+    per batch.
+
+    With 'validate', the rows are checked against the constraints of
+    the table first, and only the valid rows are written. The rejected
+    rows are appended to the reject file of the table with the reasons
+    (see validate_dataframe).
+
+    With 'upsert', rows which violate a unique constraint replace
+    the existing rows instead of failing.
+
+    The achieved rows/sec is printed for the table.
+
+    Input:
+        storage: StorageBackend
+        table_name: string
+            one of the tables in TABLE_COLUMNS
+        df: Pandas DataFrame
+            columns in the same order as TABLE_COLUMNS[table_name]
+        batch_size: int
+            number of rows per batch, default BATCH_SIZE
+        use_load_data: bool
+            use the "LOAD DATA LOCAL INFILE" fast path, default USE_LOAD_DATA
+        report: bool
+            print the rows/sec for the table
+        upsert: bool
+            update the existing rows with the same unique key
+        validate: bool
+            write only the rows which satisfy the constraints, default VALIDATE_ROWS
+        dimension: CountryDimension
+            writes the new countries of the valid rows first
+
+    Return:
+        int: number of rows written
+    """
+
+    batch_size = batch_size or BATCH_SIZE
+    use_load_data = USE_LOAD_DATA if use_load_data is None else use_load_data
+    validate = VALIDATE_ROWS if validate is None else validate
+
+    column_names = TABLE_COLUMNS[table_name]
+    start_time = perf_counter()
+
+    # Keep the rows which would fail the load out of the bulk writer
+    if validate:
+        df = reject_invalid_rows(table_name, df, upsert)
+
+    if dimension is not None:
+        dimension.store(df.iloc[:, column_names.index("country_id")])
+
+    if use_load_data and storage.supports_load_data:
+        # Dump the frame to a temporary CSV file and let the server parse it
+        # (missing values are written as \N, which LOAD DATA reads as NULL)
+        with NamedTemporaryFile(mode="w", suffix=".csv", delete=False, newline="") as tmp_file:
+            df.to_csv(tmp_file, header=False, index=False, na_rep="\\N", date_format="%Y-%m-%d")
+
+        try:
+            load_query = "LOAD DATA LOCAL INFILE '{}' {} INTO TABLE {} \
+                        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' \
+                        LINES TERMINATED BY '\\n' ({})".\
+                        format(tmp_file.name.replace("\\", "/"), "REPLACE" if upsert else "",
+                               table_name, ", ".join(column_names))
+            storage.execute(load_query)
+            storage.commit()
+        finally:
+            remove(tmp_file.name)
+
+    elif storage.supports_frame_insert:
+        # The backend reads the frame itself, in a single statement
+        storage.insert_dataframe(table_name, column_names, df, upsert)
+        storage.commit()
+
+    else:
+        insert_query = storage.insert_query(table_name, column_names, upsert)
+
+        for start in range(0, len(df), batch_size):
+            records = dataframe_to_records(df.iloc[start:start + batch_size])
+            storage.executemany(insert_query, records)
+            storage.commit()
 
-        cursor.execute(sql,tuple(row))
+    if report:
+        print_load_rate(table_name, len(df), perf_counter() - start_time)
 
-        connection.commit()
+    return len(df)
+
+
+def print_load_rate(table_name, row_count, elapsed):
+    """
+    This function prints the number of rows written into
+    a table and the achieved rows/sec.
+    """
+
+    print("{}: {} rows in {:.2f} s ({:.0f} rows/sec)".format(
+        table_name, row_count, elapsed, row_count / elapsed if elapsed else 0))
+
+    return None
+
+
+def get_covid_watermarks(storage):
+    """
+    This function returns the latest reported date of every
+    country in the 'covid_and_vac' table.
+
+    Input:
+        storage: StorageBackend
+
+    Return:
+        dict: {country_id: "YYYY-MM-DD"}
+    """
+
+    records = storage.query("SELECT country_id, MAX(date_reported) FROM covid_and_vac GROUP BY country_id")
+    watermarks = {country_id: str(last_date) for country_id, last_date in records}
+
+    return watermarks
+
+
+def filter_new_covid_rows(df_covid_vac, watermarks):
+    """
+    This function returns the rows of a cleaned covid_and_vac chunk
+    which are reported after the latest date of their country in
+    'watermarks'. All the rows of the new countries are kept.
+
+    Input:
+        df_covid_vac: Pandas DataFrame
+        watermarks: dict
+            {country_id: "YYYY-MM-DD"}, see get_covid_watermarks()
+
+    Return:
+        Pandas DataFrame
+    """
+
+    last_date = pd.to_datetime(df_covid_vac["location"].map(watermarks).astype(object))
+    is_new = last_date.isna() | (df_covid_vac["date"] > last_date)
+
+    return df_covid_vac[is_new]
+
+
+def get_populations(storage):
+    """
+    This function returns the populations stored in the 'population'
+    table, in the format used by compute_per_capita().
+
+    Input:
+        storage: StorageBackend
+
+    Return:
+        Pandas DataFrame: 'pop_2020' and 'pop_2021' indexed by country_id
+    """
+
+    records = storage.query("SELECT country_id, pop_2020, pop_2021 FROM population")
+
+    return pd.DataFrame(records, columns=TABLE_COLUMNS["population"]).set_index("country_id")
+
+
+@profiled
+def compute_per_capita(df_covid_vac, populations):
+    """
+    This function divides all the metrics of a covid_and_vac chunk by
+    the population of their country in the reported year (2020 for the
+    earlier dates and 2021 for the later dates). The rows of countries
+    without a population are dropped.
+
+    Input:
+        df_covid_vac: Pandas DataFrame
+            cleaned chunk with the country ids, see stream_covid_vac()
+        populations: Pandas DataFrame
+            'pop_2020' and 'pop_2021' indexed by country_id
+
+    Return:
+        Pandas DataFrame: columns of the 'covid_per_capita' table
+    """
+
+    metric_cols = list(COVID_VAC_STORAGE_DTYPES)
+
+    # population of the country of every row, for its reported year
+    df_pop = populations.reindex(df_covid_vac["location"].to_numpy())
+    population = np.where(df_covid_vac["date"].dt.year.to_numpy() <= 2020,
+                          df_pop["pop_2020"].to_numpy(dtype="float64"),
+                          df_pop["pop_2021"].to_numpy(dtype="float64"))
+
+    # Calculate the per population rates of all the metrics at once
+    df_rates = df_covid_vac[["location", "date"]].copy()
+    df_rates[metric_cols] = df_covid_vac[metric_cols].to_numpy(dtype="float64") / population[:, None]
+
+    return df_rates[population > 0]
+
+
+@profiled
+def stream_covid_vac(storage, file_path, aliases, matcher, dimension, chunksize=None, watermarks=None,
+                     populations=None):
+    """
+    This function streams the Covid_Vaccination_Data.csv file into
+    the 'covid_and_vac' table chunk by chunk, so the peak memory is
+    bounded by the chunk size and not by the size of the file.
+
+    With 'populations', the per population rates of every chunk are
+    written into the 'covid_per_capita' table as well.
+
+    With 'watermarks', only the rows reported after the latest date of
+    their country are written, and they are upserted. The chunks which
+    only hold rows reported before the latest dates of all the countries
+    are skipped before cleaning, but the whole file is still parsed.
+
+    Input:
+        storage: StorageBackend
+        file_path: string
+        aliases: dict
+            country alias table, see load_country_aliases()
+        matcher: CountryMatcher
+        dimension: CountryDimension
+        chunksize: int
+            number of rows per chunk, default CHUNK_SIZE
+        watermarks: dict
+            {country_id: "YYYY-MM-DD"}, see get_covid_watermarks()
+        populations: Pandas DataFrame
+            see compute_per_capita()
+
+    Return:
+        int: number of rows written
+    """
+
+    start_time = perf_counter()
+    row_count = 0
+    per_capita_count = 0
+
+    # Resolve the names of the whole file at once, so that the names
+    # of different chunks never resolve to the same country
+    names = read_covid_vac_names(file_path)
+    country_names = dict(zip(names, resolve_country_names(names, aliases, matcher, COVID_VAC_FILE)))
+
+    # The rows reported until the earliest latest date of the countries
+    # of the file are all stored already (unless a country is new)
+    skip_until = None
+
+    if watermarks is not None:
+        country_ids = [dimension.ids.get(name) for name in set(country_names.values())]
+
+        if len(country_ids) and all(country_id in watermarks for country_id in country_ids):
+            skip_until = pd.Timestamp(min(watermarks[country_id] for country_id in country_ids))
+
+    for df_chunk in read_covid_vac_chunks(file_path, country_names, chunksize, skip_until):
+        # Replace the country names with their ids and keep the ISO-3 codes
+        df_chunk["location"] = dimension.get_ids(df_chunk["location"])
+        dimension.set_iso_codes(df_chunk["location"], df_chunk.pop("iso_code"))
+
+        if watermarks is not None:
+            df_chunk = filter_new_covid_rows(df_chunk, watermarks)
+
+        # Validate the counters in their parsed dtypes, then store the valid
+        # rows (and compute their rates) in the compact dtypes
+        df_chunk = reject_invalid_rows("covid_and_vac", df_chunk, upsert=watermarks is not None)
+        df_chunk = narrow_dtypes(df_chunk, COVID_VAC_STORAGE_DTYPES)
+
+        row_count += bulk_insert_dataframe(storage, "covid_and_vac", df_chunk, report=False,
+                                           upsert=watermarks is not None, validate=False, dimension=dimension)
+
+        if populations is not None:
+            per_capita_count += bulk_insert_dataframe(storage, "covid_per_capita",
+                                                      compute_per_capita(df_chunk, populations),
+                                                      report=False, upsert=watermarks is not None)
+
+    print_load_rate("covid_and_vac", row_count, perf_counter() - start_time)
+
+    if populations is not None:
+        print("covid_per_capita: {} rows".format(per_capita_count))
+
+    return row_count
+
+
+def create_tables(storage):
+    """
+    This function creates all the tables of TABLES_DEF and the
+    indexes of INDEXES_DEF which do not exist yet.
+
+    Input:
+        storage: StorageBackend
+
+    Return:
+        None
+    """
+
+    for query in TABLES_DEF.values():
+        storage.create_table(query)
+
+    for index_name, (table_name, column_names) in INDEXES_DEF.items():
+        storage.create_index(index_name, table_name, column_names)
+
+    return None
+
+
+def store_population(storage, df_population, dimension, report=True):
+    """
+    This function writes the cleaned population dataset into the
+    'population' table, with the country names replaced by their ids.
+
+    Input:
+        storage: StorageBackend
+        df_population: Pandas DataFrame
+            see clean_population(), its names are replaced in place
+        dimension: CountryDimension
+        report: bool
+            print the rows/sec for the table
+
+    Return:
+        Pandas DataFrame: the populations of the stored rows, in the
+            format used by compute_per_capita()
+    """
+
+    df_population["name"] = dimension.get_ids(df_population["name"])
+
+    # Validate the rows first, so that the populations are the stored ones
+    # (e.g. one row of the names normalized to the same country)
+    df_population = reject_invalid_rows("population", df_population)
+    bulk_insert_dataframe(storage, "population", df_population, report=report, validate=False, dimension=dimension)
+
+    return df_population.set_index("name").set_axis(TABLE_COLUMNS["population"][1:], axis=1)
+
+
+def store_source(storage, name, df, aliases, matcher, dimension, report=True):
+    """
+    This function writes one of the cleaned medals or GDP datasets of
+    SOURCE_FILES into its table, with the country names replaced by the
+    names used in the population table (see resolve_country_names) and
+    then by their ids. The medal counts are narrowed once validated.
+
+    Input:
+        storage: StorageBackend
+        name: string
+            key of OLYMPIC_GAMES or "gdp"
+        df: Pandas DataFrame
+            see clean_source()
+        aliases: dict
+            country alias table, see load_country_aliases()
+        matcher: CountryMatcher
+        dimension: CountryDimension
+        report: bool
+            print the rows/sec for the table
+
+    Return:
+        int: number of rows written
+    """
+
+    df["Country"] = resolve_country_names(df["Country"], aliases, matcher, SOURCE_FILES[name])
+    df["Country"] = dimension.get_ids(df["Country"])
+
+    if name not in OLYMPIC_GAMES:
+        return bulk_insert_dataframe(storage, "gdp_value", df, report=report, dimension=dimension)
+
+    # One row per edition and country in the medals table, with
+    # the medal counts narrowed once they are validated
+    df.insert(0, "games_id", OLYMPIC_GAMES[name])
+    df = reject_invalid_rows("olympic_medals", df)
+    df = narrow_dtypes(df, dict.fromkeys(df.columns[2:], MEDAL_STORAGE_DTYPE))
+
+    return bulk_insert_dataframe(storage, "olympic_medals", df, report=report, validate=False, dimension=dimension)
+
+
+@profiled
+def refresh_covid_vac(storage, file_path, chunksize=None):
+    """
+    This function adds only the new rows of the Covid_Vaccination_Data.csv
+    file to the existing 'covid_and_vac' table. The whole file is still
+    parsed, but the chunks of the stored history are skipped before the
+    cleaning, and only the new rows are validated and written.
+
+    The country names are resolved against the 'population' table
+    and the country alias table.
+
+    Input:
+        storage: StorageBackend
+            connected to the "olympic" database
+        file_path: string
+        chunksize: int
+            number of rows per chunk, default CHUNK_SIZE
+
+    Return:
+        int: number of rows written
+    """
+
+    records = storage.query("SELECT c.country_name FROM population p JOIN country c ON c.country_id = p.country_id")
+    matcher = CountryMatcher(name for (name,) in records)
+
+    # tables of the databases loaded before they existed
+    create_tables(storage)
+
+    dimension = CountryDimension(storage)
+    aliases = load_country_aliases()
+    watermarks = get_covid_watermarks(storage)
+
+    row_count = stream_covid_vac(storage, file_path, aliases, matcher, dimension, chunksize, watermarks,
+                                 get_populations(storage))
+
+    # Persist the names matched in this run
+    save_country_aliases(aliases)
+    store_country_aliases(storage, aliases, dimension)
+
+    # Invalidate the cached query results
+    storage.bump_data_version()
+
+    return row_count
+
+
+def main():
+    """
+    This functions imports all the datasets into pandas dataframe,
+    cleans the data and stores in a SQL database.
+    """
+
+    # full path where data files are stored
+    dir_path = input("Enter the directory where data files are stored: " )
+
+    # Only add the rows published since the last load to the covid_and_vac table
+    incremental = input("Only add the new rows of Covid_Vaccination_Data.csv? (y/n): ").strip().lower() == "y"
+
+    if incremental:
+        storage = connect_storage(allow_local_infile=USE_LOAD_DATA)
+        refresh_covid_vac(storage, path.join(dir_path, COVID_VAC_FILE))
+        storage.close()
+
+        # Write the profile of the run (when enabled, see dmp_profiling)
+        PROFILER.write("processing")
+
+        return None
+
+    if MEMORY_REPORT:
+        print(memory_report(dir_path))
+
+    # Connect to the database (backend selected in dmp_storage)
+    storage = connect_storage(allow_local_infile=USE_LOAD_DATA)
+
+    # Create all the tables in the database
+    with PROFILER.stage("create_tables"):
+        create_tables(storage)
+
+
+    # Read and clean the datasets in parallel (Part-I of Data Pre-processing),
+    # with the stages of the worker processes recorded in the profile
+    with PROFILER.stage("preprocess"), ProcessPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {name: PROFILER.submit(executor, load_source, name, dir_path) for name in SOURCE_FILES}
+
+        # Part-II of Data Pre-processing only depends on the population table
+        df_population = futures["population"].result()
+
+        # Index the population country names once for all the fuzzy matching
+        # of the names which are not in the country alias table
+        matcher = CountryMatcher(df_population["name"])
+
+        # Load the known country name aliases (raw name -> population name)
+        aliases = load_country_aliases()
+
+
+        # Store the datasets in the SQL database, with the country
+        # names replaced by the ids of the 'country' table
+        dimension = CountryDimension(storage)
+        populations = store_population(storage, df_population, dimension)
+
+        # Stream the covid data while the other datasets are being cleaned,
+        # with its per population rates
+        stream_covid_vac(storage, path.join(dir_path, COVID_VAC_FILE), aliases, matcher, dimension,
+                         populations=populations)
+
+        # Replace the country names with the names used in the population table
+        # and write the datasets in batches as soon as they are cleaned.
+        # Only the names not seen in any earlier run are fuzzy matched.
+        for name in list(OLYMPIC_GAMES) + ["gdp"]:
+            store_source(storage, name, futures[name].result(), aliases, matcher, dimension)
+
+    # Persist the alias table with the names matched in this run
+    with PROFILER.stage("store_aliases"):
+        save_country_aliases(aliases)
+        store_country_aliases(storage, aliases, dimension)
+
+    # Invalidate the cached query results
+    storage.bump_data_version()
     
 
-    # Close the database connections
-    cursor.close()
-    connection.close()
+    # Close the database connection
+    storage.close()
+
+    # Write the profile of the run (when enabled, see dmp_profiling)
+    PROFILER.write("processing")
 
 
 
@@ -0,0 +1,732 @@
+"""
+Benchmark Module
+
+This module generates synthetic datasets with the same files and columns
+as the collected datasets, at a configurable scale (number of countries
+and years of daily covid rows, with noisy variants of the country names),
+and times every stage of the pipeline on them: parsing, cleaning and
+normalization of the country names, reconciliation of the names with the
+population table, loading into the database and the analysis queries.
+
+The benchmark runs against an embedded SQLite or DuckDB database file,
+so no database server or manual input is needed. The timings are stored
+as a baseline which the next runs are compared with.
+
+Usage:
+    python dmp_benchmark.py --countries 1000 --years 10 --backend duckdb
+    python dmp_benchmark.py --save-baseline
+"""
+
+author = "Tanuja Seervi, Bikiran Choudhury"
+
+
+import argparse
+import importlib.util
+import json
+import platform
+import sys
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime
+from os import makedirs, path, remove
+from time import perf_counter
+
+from dmp_storage import connect_storage, DATABASE_FILES
+
+
+# Directory of the generated datasets, the benchmark databases and the results
+BENCHMARK_DIR = path.join(path.dirname(path.abspath(__file__)), "benchmark")
+
+# Stored baseline timings, by backend and scale (see result_key())
+BASELINE_FILE = path.join(BENCHMARK_DIR, "baseline.json")
+
+# Default scale of the generated datasets
+N_COUNTRIES = 1000
+N_YEARS = 10
+SEED = 0
+
+# First day of the generated covid data
+START_DATE = "2020-01-01"
+
+# Share of the country names written as a noisy variant in every dataset
+NAME_NOISE = 0.3
+
+# Share of the covid counters left empty
+MISSING_RATE = 0.03
+
+# Countries of the covid data generated (and written) at a time
+GENERATE_BLOCK_SIZE = 100
+
+# Layout of GDP_Actual_Value.csv expected by clean_gdp(): a blank first row,
+# 197 countries, 31 regions and 2 blank footer rows. Extra countries are
+# appended after the footer rows.
+GDP_COUNTRY_ROWS = 197
+GDP_REGION_ROWS = 31
+GDP_YEARS = range(1980, 2027)
+
+# Extra columns of the datasets, which are not read by the pipeline
+POPULATION_EXTRA_COLUMNS = ["pop2050", "pop2030", "pop2019", "pop2015", "pop2010", "pop2000",
+                            "pop1990", "pop1980", "pop1970", "area", "Density", "GrowthRate",
+                            "WorldPercentage"]
+COVID_EXTRA_COLUMNS = ["new_cases_smoothed", "total_cases_per_million", "reproduction_rate",
+                       "stringency_index", "population", "median_age"]
+
+# Syllables of the generated country names
+NAME_SYLLABLES = ["al", "ba", "ca", "dor", "el", "fa", "ga", "han", "is", "ja", "ka", "lan", "ma", "nor",
+                  "o", "pa", "qu", "ri", "sa", "ta", "u", "ve", "win", "xa", "ya", "zan", "be", "di",
+                  "ge", "lo", "mi", "ne", "ro", "si", "tu", "vi"]
+NAME_SUFFIXES = ["Islands", "Republic", "Federation", "Union"]
+
+# Number of countries of the covid, GDP and performance queries
+QUERY_COUNTRIES = 10
+
+# Runs of every query, the fastest one is kept
+QUERY_REPEAT = 3
+
+# A stage is reported as a regression when it is slower than the
+# baseline by more than this ratio and by more than these seconds
+# (the shortest stages vary by more than the ratio from run to run)
+REGRESSION_THRESHOLD = 1.2
+REGRESSION_MIN_SECONDS = 0.05
+
+
+def load_module(name, file_name):
+    """
+    This function imports one of the modules of the pipeline, whose
+    file names are not valid module names.
+
+    Input:
+        name: string
+            name of the module in sys.modules
+        file_name: string
+            file of the module, next to this one
+
+    Return:
+        module
+    """
+
+    spec = importlib.util.spec_from_file_location(name, path.join(path.dirname(path.abspath(__file__)), file_name))
+    module = importlib.util.module_from_spec(spec)
+
+    # registered before running it, so that its functions can be pickled
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+    return module
+
+
+processing = load_module("dmp_processing", "DMP_Data Processing and Storing.py")
+analysis = load_module("dmp_analysis", "DMP_Data Analysis and Visualisation.py")
+
+
+def country_names(n_countries, rng):
+    """
+    This function returns 'n_countries' distinct made up country names.
+
+    Input:
+        n_countries: int
+        rng: NumPy Generator
+
+    Return:
+        list[strings]
+    """
+
+    names = {}
+
+    while len(names) < n_countries:
+        words = ["".join(rng.choice(NAME_SYLLABLES, rng.integers(2, 4))).capitalize()
+                 for _ in range(rng.integers(1, 3))]
+
+        if rng.random() < 0.15:
+            words.append(rng.choice(NAME_SUFFIXES))
+
+        names[" ".join(words)] = None
+
+    return list(names)
+
+
+def letter_codes(n_codes, length):
+    """
+    This function returns 'n_codes' codes of 'length' upper case
+    letters ("AAA", "AAB", ...), repeated after 26 ** length codes.
+    """
+
+    return ["".join(chr(65 + i // 26 ** k % 26) for k in reversed(range(length))) for i in range(n_codes)]
+
+
+def noisy_name(name, code, rng):
+    """
+    This function returns a variant of the country name as found in the
+    collected datasets: with a parenthesis, diacritics or underscores
+    (removed by the normalization) or with a typo (fuzzy matched).
+
+    Input:
+        name: string
+        code: string
+            ISO-3 code of the country
+        rng: NumPy Generator
+
+    Return:
+        string
+    """
+
+    variant = rng.integers(4)
+
+    if variant == 0 or len(name) < 5:
+        return "{} ({})".format(name, code)
+
+    if variant == 1 and any(c in name for c in "aeo"):
+        return name.translate(str.maketrans("aeo", "áéó"))
+
+    if variant == 2 and " " in name:
+        return name.replace(" ", "_")
+
+    # swap two letters of the name
+    i = rng.integers(1, len(name) - 2)
+
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def source_names(names, codes, rng, noise=None):
+    """
+    This function returns the country names as written in one of
+    the datasets: a share 'noise' of them is a noisy variant.
+
+    Input:
+        names: list[strings]
+        codes: list[strings]
+            ISO-3 codes of the countries
+        rng: NumPy Generator
+        noise: float
+            default NAME_NOISE
+
+    Return:
+        list[strings]
+    """
+
+    noise = NAME_NOISE if noise is None else noise
+
+    return [noisy_name(name, code, rng) if rng.random() < noise else name for name, code in zip(names, codes)]
+
+
+def medal_table(names, strength, rng):
+    """
+    This function returns random gold, silver and bronze medal counts
+    of the countries which win at least one medal.
+
+    Input:
+        names: list[strings]
+        strength: NumPy array
+            expected number of medals of every country
+        rng: NumPy Generator
+
+    Return:
+        Pandas DataFrame with the columns: Country, Gold, Silver, Bronze, Total
+    """
+
+    df = pd.DataFrame({"Country": names})
+
+    for medal in ["Gold", "Silver", "Bronze"]:
+        df[medal] = rng.poisson(strength / 3)
+
+    df["Total"] = df[["Gold", "Silver", "Bronze"]].sum(axis=1)
+
+    return df[df["Total"] > 0].sort_values(["Gold", "Silver", "Bronze"], ascending=False)
+
+
+def write_covid_vac(file_path, names, codes, populations, n_years, rng):
+    """
+    This function writes the Covid_Vaccination_Data.csv file with the
+    daily rows of all the countries, sorted by country and date, and
+    the rows of the 'World' aggregate. The rows are generated and
+    written GENERATE_BLOCK_SIZE countries at a time.
+
+    Input:
+        file_path: string
+        names: list[strings]
+            country names as written in the file
+        codes: list[strings]
+            ISO-3 codes of the countries
+        populations: NumPy array
+            population of the countries
+        n_years: int
+        rng: NumPy Generator
+
+    Return:
+        int: number of rows written
+    """
+
+    dates = pd.date_range(START_DATE, pd.Timestamp(START_DATE) + pd.DateOffset(years=n_years), inclusive="left")
+    n_days = len(dates)
+    days = np.arange(n_days)
+
+    counters = ["total_cases", "new_cases", "total_deaths", "new_deaths",
+                "people_vaccinated", "people_fully_vaccinated"]
+    world = np.zeros((len(counters), n_days), dtype="int64")
+    row_count = 0
+
+    # share of the population vaccinated, from the end of the first year
+    vaccinated = 0.8 / (1 + np.exp(-(days - 450) / 60))
+    vaccinated[days < 340] = np.nan
+
+    for start in range(0, len(names), GENERATE_BLOCK_SIZE):
+        block = slice(start, start + GENERATE_BLOCK_SIZE)
+        population = populations[block, None]
+        n_block = len(population)
+
+        new_cases = rng.poisson(population * 2e-5, (n_block, n_days))
+        new_deaths = rng.binomial(new_cases, 0.01)
+        values = [new_cases.cumsum(axis=1), new_cases, new_deaths.cumsum(axis=1), new_deaths,
+                  np.floor(population * vaccinated), np.floor(population * vaccinated * 0.9)]
+
+        for i, value in enumerate(values):
+            world[i] += np.nan_to_num(value).astype("int64").sum(axis=0)
+
+        df = pd.DataFrame({
+            "iso_code": np.repeat(codes[block], n_days),
+            "continent": np.repeat(rng.choice(["AF", "AS", "EU", "NA", "OC", "SA"], n_block), n_days),
+            "location": np.repeat(names[block], n_days),
+            "date": np.tile(dates.strftime("%Y-%m-%d"), n_block)
+        })
+
+        for col, value in zip(counters, values):
+            value = pd.array(value.ravel(), dtype="Float64").astype("Int64")
+            value[rng.random(len(value)) < MISSING_RATE] = pd.NA
+            df[col] = value
+
+        for col in COVID_EXTRA_COLUMNS:
+            df[col] = rng.random(len(df)).round(3)
+
+        df.to_csv(file_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        row_count += len(df)
+
+    # The counters of the aggregate rows exceed 32 bits
+    df_world = pd.DataFrame({"iso_code": "OWID_WRL", "continent": None, "location": "World",
+                             "date": dates.strftime("%Y-%m-%d"), **dict(zip(counters, world))})
+
+    for col in COVID_EXTRA_COLUMNS:
+        df_world[col] = 0.0
+
+    df_world.to_csv(file_path, mode="a", header=False, index=False)
+
+    return row_count + len(df_world)
+
+
+def generate_datasets(dir_path, n_countries=None, n_years=None, seed=None):
+    """
+    This function writes all the data files read by the Data Pre-processing
+    module, with the same file names and columns, for 'n_countries' made up
+    countries and 'n_years' of daily covid data.
+
+    Every file writes a share NAME_NOISE of the country names as a noisy
+    variant of the name of the population file.
+
+    Input:
+        dir_path: string
+            directory where data files are written
+        n_countries: int
+            default N_COUNTRIES, at least GDP_COUNTRY_ROWS
+        n_years: int
+            default N_YEARS
+        seed: int
+            default SEED
+
+    Return:
+        dict: {file name: number of rows}
+    """
+
+    n_countries = n_countries or N_COUNTRIES
+    n_years = n_years or N_YEARS
+
+    if n_countries < GDP_COUNTRY_ROWS:
+        raise ValueError("At least {} countries are needed for the layout of {}".
+                         format(GDP_COUNTRY_ROWS, processing.SOURCE_FILES["gdp"]))
+
+    rng = np.random.default_rng(SEED if seed is None else seed)
+    makedirs(dir_path, exist_ok=True)
+    rows = {}
+
+    names = country_names(n_countries, rng)
+    codes = np.array(letter_codes(n_countries, 3))
+
+    # Population_2020-21.csv: the master list of the names (values in thousands)
+    pop_2020 = np.clip(rng.lognormal(8, 2, n_countries), 1, 1.5e6).round(3)
+    df_population = pd.DataFrame({"cca2": letter_codes(n_countries, 2), "name": names,
+                                  "pop2021": (pop_2020 * rng.normal(1.01, 0.01, n_countries)).round(3),
+                                  "pop2020": pop_2020})
+
+    for col in POPULATION_EXTRA_COLUMNS:
+        df_population[col] = (pop_2020 * rng.random(n_countries)).round(3)
+
+    df_population["rank"] = df_population["pop2021"].rank(ascending=False, method="first").astype(int)
+    df_population = df_population.sort_values("rank")
+    df_population.to_csv(path.join(dir_path, processing.SOURCE_FILES["population"]), index=False)
+    rows["population"] = len(df_population)
+
+    # Medals of the three Olympic Games: a share of the countries win medals
+    strength = rng.gamma(0.4, 10, n_countries)
+
+    df_tokyo = medal_table(source_names(names, codes, rng), strength, rng)
+    df_tokyo.columns = ["Country", "Gold Medal", "Silver Medal", "Bronze Medal", "Total"]
+    df_tokyo["Rank By Total"] = df_tokyo["Total"].rank(ascending=False, method="min").astype(int)
+    df_tokyo.to_csv(path.join(dir_path, processing.SOURCE_FILES["tokyo"]), index=False)
+
+    df_rio = medal_table(source_names(names, codes, rng), strength, rng)
+    df_rio.drop(columns="Total").to_csv(path.join(dir_path, processing.SOURCE_FILES["rio"]), index=False)
+
+    df_london = medal_table(source_names(names, codes, rng), strength, rng)
+    df_london.columns = ["Country", "Gold Medal", "Silver Medal", "Bronze Medal", "Total"]
+    df_london.to_csv(path.join(dir_path, processing.SOURCE_FILES["london"]), index=False)
+
+    rows.update(tokyo=len(df_tokyo), rio=len(df_rio), london=len(df_london))
+
+    # GDP_Actual_Value.csv, in the layout expected by clean_gdp()
+    gdp_names = source_names(names, codes, rng)
+    regions = ["Region {}".format(i) for i in range(GDP_REGION_ROWS)]
+    row_names = [None] + gdp_names[:GDP_COUNTRY_ROWS] + regions + [None, None] + gdp_names[GDP_COUNTRY_ROWS:]
+
+    gdp = pd.DataFrame(rng.lognormal(3, 2, (len(row_names), len(GDP_YEARS))).round(3),
+                       columns=[str(year) for year in GDP_YEARS]).astype(object)
+    gdp[rng.random(gdp.shape) < MISSING_RATE] = "no data"
+    gdp.insert(0, "GDP, current prices (Billions of U.S. dollars)", row_names)
+    gdp.iloc[[0, GDP_COUNTRY_ROWS + GDP_REGION_ROWS + 1, GDP_COUNTRY_ROWS + GDP_REGION_ROWS + 2], 1:] = None
+    gdp.to_csv(path.join(dir_path, processing.SOURCE_FILES["gdp"]), index=False, encoding="ISO-8859-1")
+    rows["gdp"] = len(gdp)
+
+    # Covid_Vaccination_Data.csv, one name per country for all its rows
+    rows["covid"] = write_covid_vac(path.join(dir_path, processing.COVID_VAC_FILE),
+                                    np.array(source_names(names, codes, rng)), codes,
+                                    df_population.set_index("name").loc[names, "pop2020"].to_numpy() * 1000,
+                                    n_years, rng)
+
+    return rows
+
+
+@contextmanager
+def timed(timings, stage):
+    """
+    This context manager adds the seconds spent in its block
+    to timings[stage].
+    """
+
+    start_time = perf_counter()
+
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + perf_counter() - start_time
+
+
+def time_query(func, *args, repeat=None):
+    """
+    This function runs a query function 'repeat' times (default
+    QUERY_REPEAT) and returns the seconds of the fastest run.
+    """
+
+    elapsed = []
+
+    for _ in range(repeat or QUERY_REPEAT):
+        start_time = perf_counter()
+        func(*args)
+        elapsed.append(perf_counter() - start_time)
+
+        # the medal deviations are cached by the analysis module
+        analysis.MEDAL_DEVIATION_CACHE.clear()
+
+    return min(elapsed)
+
+
+def run_pipeline(dir_path, storage, timings):
+    """
+    This function runs the Data Pre-processing of the datasets in
+    'dir_path' with the load functions of main(), one stage after the
+    other on a single process, and adds the seconds of every stage to
+    'timings':
+
+        parse: reading the columns of DTYPE_SCHEMA of the datasets
+            read as a whole (SOURCE_FILES)
+        normalize: their basic cleaning and normal form of the country names
+        load.population: creating the tables and writing the population
+        stream.covid_and_vac: streaming Covid_Vaccination_Data.csv chunk
+            by chunk (parsing, cleaning, reconciling the country names,
+            validation and writing), see stream_covid_vac()
+        load.sources: reconciling the country names of the medals and GDP
+            datasets and writing them, see store_source()
+
+    The country names are reconciled with an empty alias table, so
+    every variant is matched.
+
+    Input:
+        dir_path: string
+            directory where data files are stored
+        storage: StorageBackend
+            connected to an empty database
+        timings: dict
+
+    Return:
+        dict: {table name: number of rows}
+    """
+
+    with timed(timings, "parse"):
+        frames = {name: processing.read_source(name, path.join(dir_path, file_name))
+                  for name, file_name in processing.SOURCE_FILES.items()}
+
+    with timed(timings, "normalize"):
+        frames = {name: processing.clean_source(name, df) for name, df in frames.items()}
+
+    with timed(timings, "load.population"):
+        processing.create_tables(storage)
+
+        df_population = frames["population"]
+        matcher = processing.CountryMatcher(df_population["name"])
+        aliases = {}
+
+        dimension = processing.CountryDimension(storage)
+        populations = processing.store_population(storage, df_population, dimension, report=False)
+
+    with timed(timings, "stream.covid_and_vac"):
+        covid_rows = processing.stream_covid_vac(storage, path.join(dir_path, processing.COVID_VAC_FILE), aliases,
+                                                 matcher, dimension, populations=populations)
+
+    with timed(timings, "load.sources"):
+        rows = {name: processing.store_source(storage, name, frames[name], aliases, matcher, dimension, report=False)
+                for name in list(processing.OLYMPIC_GAMES) + ["gdp"]}
+
+        processing.store_country_aliases(storage, aliases, dimension)
+        storage.bump_data_version()
+
+    return {"population": len(df_population), "covid_and_vac": covid_rows, "aliases": len(aliases), **rows}
+
+
+def run_queries(storage, timings):
+    """
+    This function times every query function of the Data Analysis
+    module on the loaded database and adds the seconds of the fastest
+    of QUERY_REPEAT runs to timings["query.<function>"].
+
+    Input:
+        storage: StorageBackend
+            connected to the loaded database
+        timings: dict
+
+    Return:
+        None
+    """
+
+    countries = [name for _, name in sorted(analysis.get_country_names(storage).items())][:QUERY_COUNTRIES]
+    years = [["2020-01-01", "2020-12-31"], ["2021-01-01", "2021-06-30"]]
+
+    timings["query.get_all_country_performance"] = time_query(analysis.get_all_country_performance, storage,
+                                                              analysis.OLYMPIC_GAMES, "total_medals")
+    timings["query.get_medal_deviations"] = time_query(analysis.get_medal_deviations, storage)
+
+    for resolution in ["day", "week", "month"]:
+        timings["query.get_covid_death_vac_metrics.{}".format(resolution)] = \
+            time_query(analysis.get_covid_death_vac_metrics, storage, countries, years,
+                       analysis.TREND_METRICS, resolution)
+
+    timings["query.fetch_country_gdp"] = time_query(analysis.fetch_country_gdp, storage, tuple(countries))
+    timings["query.fetch_country_performance"] = time_query(analysis.fetch_country_performance, storage,
+                                                            countries[0])
+    timings["query.load_report_data"] = time_query(analysis.load_report_data, storage)
+
+    return None
+
+
+def result_key(backend, n_countries, n_years):
+    """
+    This function returns the key of the results of a backend and scale
+    in the baseline file, e.g. "duckdb-1000x10".
+    """
+
+    return "{}-{}x{}".format(backend, n_countries, n_years)
+
+
+def run_benchmark(backend="sqlite", n_countries=None, n_years=None, seed=None, work_dir=None):
+    """
+    This function generates the datasets of the given scale (once, they
+    are kept in 'work_dir' for the next runs), loads them into a new
+    database file of the given embedded backend and times every stage.
+
+    Input:
+        backend: string
+            "sqlite" or "duckdb"
+        n_countries: int
+            default N_COUNTRIES
+        n_years: int
+            default N_YEARS
+        seed: int
+            default SEED
+        work_dir: string
+            default BENCHMARK_DIR
+
+    Return:
+        dict: the results, with the seconds of every stage in "timings"
+    """
+
+    n_countries = n_countries or N_COUNTRIES
+    n_years = n_years or N_YEARS
+    seed = SEED if seed is None else seed
+    work_dir = work_dir or BENCHMARK_DIR
+
+    dir_path = path.join(work_dir, "data-{}x{}-{}".format(n_countries, n_years, seed))
+    timings = {}
+
+    if not path.exists(path.join(dir_path, processing.COVID_VAC_FILE)):
+        with timed(timings, "generate"):
+            generate_datasets(dir_path, n_countries, n_years, seed)
+
+    # a new database for every run, with the rejected rows kept apart
+    db_path = path.join(work_dir, DATABASE_FILES[backend])
+    processing.REJECT_DIR = path.join(work_dir, "rejects")
+
+    if path.exists(db_path):
+        remove(db_path)
+
+    storage = connect_storage(backend, file_path=db_path)
+
+    try:
+        rows = run_pipeline(dir_path, storage, timings)
+        run_queries(storage, timings)
+    finally:
+        storage.close()
+
+    # the generation of the datasets is not a stage of the pipeline
+    timings.pop("generate", None)
+
+    return {"key": result_key(backend, n_countries, n_years), "backend": backend,
+            "countries": n_countries, "years": n_years, "seed": seed, "rows": rows,
+            "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+            "python": platform.python_version(), "pandas": pd.__version__,
+            "date": datetime.now().isoformat(timespec="seconds")}
+
+
+def load_baseline(file_path=None):
+    """
+    This function loads the baseline results (see save_baseline()).
+
+    Input:
+        file_path: string
+            default BASELINE_FILE
+
+    Return:
+        dict: {result key: results}
+    """
+
+    file_path = file_path or BASELINE_FILE
+
+    if not path.exists(file_path):
+        return {}
+
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, file_path=None):
+    """
+    This function stores the results as the baseline of their backend
+    and scale, keeping the baselines of the other ones.
+
+    Input:
+        results: dict
+            see run_benchmark()
+        file_path: string
+            default BASELINE_FILE
+
+    Return:
+        None
+    """
+
+    file_path = file_path or BASELINE_FILE
+    baseline = load_baseline(file_path)
+    baseline[results["key"]] = results
+
+    makedirs(path.dirname(file_path), exist_ok=True)
+
+    with open(file_path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+    return None
+
+
+def compare_results(results, baseline, threshold=None):
+    """
+    This function compares the timings of every stage with the baseline.
+
+    Input:
+        results: dict
+            see run_benchmark()
+        baseline: dict
+            results of the same backend and scale
+        threshold: float
+            default REGRESSION_THRESHOLD
+
+    Return:
+        Pandas DataFrame with the seconds of the 'baseline' and 'current'
+        runs, their 'ratio' and 'regression' by stage
+    """
+
+    threshold = threshold or REGRESSION_THRESHOLD
+
+    df = pd.DataFrame({"baseline": pd.Series(baseline["timings"], dtype="float64"),
+                       "current": pd.Series(results["timings"], dtype="float64")})
+    df["ratio"] = (df["current"] / df["baseline"]).round(2)
+    df["regression"] = (df["ratio"] > threshold) & (df["current"] - df["baseline"] > REGRESSION_MIN_SECONDS)
+
+    return df
+
+
+def main():
+    """
+    This function runs the benchmark, writes its results and compares
+    them with the stored baseline of the same backend and scale. It
+    exits with status 1 when a stage regressed.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark of the data pipeline on synthetic datasets")
+    parser.add_argument("--countries", type=int, default=N_COUNTRIES)
+    parser.add_argument("--years", type=int, default=N_YEARS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--backend", choices=["sqlite", "duckdb"], default="sqlite")
+    parser.add_argument("--work-dir", default=BENCHMARK_DIR)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the baseline of this backend and scale")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.backend, args.countries, args.years, args.seed, args.work_dir)
+
+    # Write the results of the run
+    results_file = path.join(args.work_dir, "results-{}.json".format(results["key"]))
+
+    with open(results_file, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print("Benchmark {} ({} covid rows):".format(results["key"], results["rows"]["covid_and_vac"]))
+
+    baseline_file = path.join(args.work_dir, path.basename(BASELINE_FILE))
+    baseline = load_baseline(baseline_file).get(results["key"])
+
+    if args.save_baseline or baseline is None:
+        print(pd.Series(results["timings"], name="seconds").to_string())
+        save_baseline(results, baseline_file)
+        print("Baseline stored in {}".format(baseline_file))
+
+        return None
+
+    # Compare with the baseline
+    df_comparison = compare_results(results, baseline)
+    print(df_comparison.to_string())
+
+    if df_comparison["regression"].any():
+        print("Regression (slower than the baseline of {} by more than {:.0%}): {}".
+              format(baseline["date"], REGRESSION_THRESHOLD - 1,
+                     ", ".join(df_comparison.index[df_comparison["regression"]])))
+        sys.exit(1)
+
+    return None
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Profiling Module
+
+This module provides the opt-in instrumentation of the Data Pre-processing
+and the Data Analysis modules. When it is enabled, every stage of the
+pipeline records its wall time, CPU time, peak memory and number of rows,
+every SQL statement run by dmp_storage records its latency and number of
+rows, and the results are written as a JSON file at the end of the run
+(with an optional cProfile dump of every top level stage).
+
+The instrumentation is enabled without editing the code, with the
+environment variables:
+
+    DMP_PROFILE_DIR: directory of the JSON results (and cProfile dumps)
+    DMP_PROFILE_CPROFILE: "1" to write a cProfile (pstats) dump per stage
+
+The peak memory is traced with tracemalloc, which slows down the
+allocations, so a profiled run is slower than a normal run.
+
+For example:
+    DMP_PROFILE_DIR=profiles python "DMP_Data Processing and Storing.py"
+    python -m pstats profiles/processing-20220101-120000-preprocess.pstats
+"""
+
+author = "Tanuja Seervi, Bikiran Choudhury"
+
+
+import cProfile
+import json
+import pstats
+import re
+import tracemalloc
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from os import environ, getpid, makedirs, path
+from threading import Lock, local
+from time import perf_counter, process_time
+
+
+# Directory of the results, None: the instrumentation is disabled
+PROFILE_DIR = environ.get("DMP_PROFILE_DIR") or None
+
+# Write a cProfile dump of every top level stage
+PROFILE_CPROFILE = environ.get("DMP_PROFILE_CPROFILE", "0") not in ("", "0")
+
+# Characters of the stage names which are replaced in the file names
+FILE_NAME_REGEX = re.compile(r"[^\w.-]+")
+
+
+def result_rows(result):
+    """
+    Return the number of rows of the result of a stage: the result
+    itself for a row count, its length for a DataFrame, a Series or
+    a list, None otherwise.
+    """
+
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class Profiler:
+    """
+    Recorder of the pipeline stages and the SQL statements.
+
+    A stage is the block of a stage() context manager (or a call of a
+    function decorated with profiled()). The stages nested in a stage
+    are recorded under the path "stage/nested stage", and all the runs
+    of a path are aggregated: number of calls, wall and CPU seconds,
+    peak memory and rows.
+
+    The CPU time is the time of the whole process, so it includes the
+    other threads and excludes the worker processes. The peak memory is
+    the peak of the memory allocated (traced by tracemalloc) above the
+    memory allocated when the stage started. Concurrent stages in other
+    threads share it.
+
+    Input:
+        profile_dir: string
+            directory of the results, None: disabled
+        cprofile: bool
+            write a cProfile dump of every top level stage
+    """
+
+    def __init__(self, profile_dir=None, cprofile=False):
+        self.lock = Lock()
+
+        # stack of the running stages of every thread
+        self.local = local()
+
+        self.enabled = False
+        self.enable(profile_dir, cprofile)
+        self.reset()
+
+    def enable(self, profile_dir, cprofile=False):
+        """
+        Enable (or disable, without 'profile_dir') the instrumentation.
+        """
+
+        self.profile_dir = profile_dir
+        self.cprofile = cprofile
+        self.enabled = profile_dir is not None
+
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        return None
+
+    def reset(self):
+        """
+        Forget the recorded stages and statements.
+        """
+
+        with self.lock:
+            # aggregates by stage path and by statement
+            self.stages = {}
+            self.statements = {}
+
+            # pstats.Stats of the top level stages by path
+            self.profiles = {}
+
+            self.started = datetime.now()
+
+        # stages of the calling thread left running (e.g. by a forked worker process)
+        self.local.stack = []
+
+        return None
+
+    def stack(self):
+        """
+        Return the running stages of the calling thread.
+        """
+
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+
+        return self.local.stack
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Record the block as the stage 'name'. The block can set the
+        number of rows processed in the yielded dict: record["rows"].
+        """
+
+        if not self.enabled:
+            yield {}
+            return
+
+        stack = self.stack()
+        parent = stack[-1] if stack else None
+
+        # The peak allocated so far belongs to the parent stage
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+
+        if parent is not None:
+            parent["peak_memory"] = max(parent["peak_memory"], peak_memory)
+
+        tracemalloc.reset_peak()
+
+        frame = {"path": "{}/{}".format(parent["path"], name) if parent else name, "rows": None,
+                 "start_memory": current_memory, "peak_memory": current_memory}
+        stack.append(frame)
+
+        # Only the top level stages are profiled: a thread runs one profiler at a time
+        profile = None
+
+        if self.cprofile and parent is None:
+            profile = cProfile.Profile()
+
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is active (e.g. in another thread)
+                profile = None
+
+        start_time, start_cpu = perf_counter(), process_time()
+
+        try:
+            yield frame
+        finally:
+            wall, cpu = perf_counter() - start_time, process_time() - start_cpu
+
+            if profile is not None:
+                profile.disable()
+
+            stack.pop()
+            frame["peak_memory"] = max(frame["peak_memory"], tracemalloc.get_traced_memory()[1])
+
+            if parent is not None:
+                parent["peak_memory"] = max(parent["peak_memory"], frame["peak_memory"])
+
+            self.add_stage(frame["path"], {"calls": 1, "wall_seconds": wall, "cpu_seconds": cpu,
+                                           "peak_memory_bytes": frame["peak_memory"] - frame["start_memory"],
+                                           "rows": frame["rows"]})
+
+            if profile is not None:
+                with self.lock:
+                    if frame["path"] in self.profiles:
+                        self.profiles[frame["path"]].add(profile)
+                    else:
+                        self.profiles[frame["path"]] = pstats.Stats(profile)
+
+    def add_stage(self, stage_path, record):
+        """
+        Add the record of a run of a stage to its aggregate.
+        """
+
+        with self.lock:
+            total = self.stages.get(stage_path)
+
+            if total is None:
+                self.stages[stage_path] = dict(record)
+                return None
+
+            total["calls"] += record["calls"]
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            total["peak_memory_bytes"] = max(total["peak_memory_bytes"], record["peak_memory_bytes"])
+
+            if record["rows"] is not None:
+                total["rows"] = (total["rows"] or 0) + record["rows"]
+
+        return None
+
+    @contextmanager
+    def statement(self, query):
+        """
+        Record the block as a run of the SQL statement 'query'. The block
+        sets the number of rows returned (or written) in record["rows"].
+        """
+
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {"rows": None}
+        start_time = perf_counter()
+
+        try:
+            yield record
+        finally:
+            self.add_statement(" ".join(query.split()), {"calls": 1, "total_seconds": perf_counter() - start_time,
+                                                         "rows": record["rows"]})
+
+    def add_statement(self, query, record):
+        """
+        Add the record of runs of a statement to its aggregate.
+        """
+
+        with self.lock:
+            total = self.statements.get(query)
+
+            if total is None:
+                total = self.statements[query] = {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "rows": 0}
+
+            total["calls"] += record["calls"]
+            total["total_seconds"] += record["total_seconds"]
+            total["max_seconds"] = max(total["max_seconds"], record.get("max_seconds", record["total_seconds"]))
+            total["rows"] += record["rows"] or 0
+
+        return None
+
+    def merge(self, stages, statements, profiles=None):
+        """
+        Add the stages, statements and cProfile statistics (raw pstats
+        dicts by stage path) recorded by another process.
+        """
+
+        for stage_path, record in stages.items():
+            self.add_stage(stage_path, record)
+
+        for query, record in statements.items():
+            self.add_statement(query, record)
+
+        for stage_path, raw_stats in (profiles or {}).items():
+            stats = pstats.Stats()
+            stats.stats = raw_stats
+            stats.get_top_level_stats()
+
+            with self.lock:
+                if stage_path in self.profiles:
+                    self.profiles[stage_path].add(stats)
+                else:
+                    self.profiles[stage_path] = stats
+
+        return None
+
+    def submit(self, executor, func, *args, **kwargs):
+        """
+        Submit func(*args, **kwargs) to a process pool executor. When the
+        instrumentation is enabled, the stages, statements and cProfile
+        statistics recorded by the worker process are merged into this
+        profiler, so the runs of a stage in all the tasks share a dump.
+
+        Return:
+            Future of the result of the function
+        """
+
+        if not self.enabled:
+            return executor.submit(func, *args, **kwargs)
+
+        future = Future()
+
+        def done(worker_future):
+            try:
+                result, stages, statements, profiles = worker_future.result()
+            except BaseException as e:
+                future.set_exception(e)
+                return
+
+            self.merge(stages, statements, profiles)
+            future.set_result(result)
+
+        executor.submit(call_profiled, (self.profile_dir, self.cprofile), func, args, kwargs).add_done_callback(done)
+
+        return future
+
+    def report(self, name):
+        """
+        Return the recorded stages (in the order they started) and the
+        statements (slowest first) as a JSON serializable dict.
+        """
+
+        with self.lock:
+            stages = [dict(record, stage=stage_path) for stage_path, record in self.stages.items()]
+            statements = [dict(record, query=query, mean_seconds=record["total_seconds"] / record["calls"])
+                          for query, record in self.statements.items()]
+
+        statements.sort(key=lambda record: record["total_seconds"], reverse=True)
+
+        return {"module": name, "started": self.started.isoformat(timespec="seconds"),
+                "finished": datetime.now().isoformat(timespec="seconds"), "pid": getpid(),
+                "stages": stages, "statements": statements}
+
+    def write_profiles(self, prefix):
+        """
+        Write the cProfile dump of every top level stage as
+        '<profile_dir>/<prefix>-<stage>.pstats'.
+        """
+
+        makedirs(self.profile_dir, exist_ok=True)
+
+        with self.lock:
+            for stage_path, stats in self.profiles.items():
+                stats.dump_stats(path.join(self.profile_dir, "{}-{}.pstats".
+                                           format(prefix, FILE_NAME_REGEX.sub("_", stage_path))))
+
+        return None
+
+    def write(self, name):
+        """
+        Write the report of the run of the module 'name' as
+        '<profile_dir>/<name>-<start time>.json', with the cProfile
+        dumps when enabled.
+
+        Return:
+            string: path of the JSON file (None when disabled)
+        """
+
+        if not self.enabled:
+            return None
+
+        prefix = "{}-{}".format(name, self.started.strftime("%Y%m%d-%H%M%S"))
+        file_path = path.join(self.profile_dir, prefix + ".json")
+
+        self.write_profiles(prefix)
+
+        with open(file_path, "w") as f:
+            json.dump(self.report(name), f, indent=2)
+
+        print("Profile written to {}".format(file_path))
+
+        return file_path
+
+
+# Profiler of the pipeline, configured by the environment variables
+PROFILER = Profiler(PROFILE_DIR, PROFILE_CPROFILE)
+
+
+def call_profiled(config, func, args, kwargs):
+    """
+    This function runs a function in a worker process of Profiler.submit()
+    and returns its result with the stages, statements and cProfile
+    statistics (raw pstats dicts, which can be pickled) it recorded.
+    """
+
+    PROFILER.enable(*config)
+    PROFILER.reset()
+
+    result = func(*args, **kwargs)
+
+    profiles = {stage_path: stats.stats for stage_path, stats in PROFILER.profiles.items()}
+
+    return result, PROFILER.stages, PROFILER.statements, profiles
+
+
+def profiled(func):
+    """
+    Decorator which records every call of the function as a stage
+    named after it, with the number of rows of its result.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PROFILER.enabled:
+            return func(*args, **kwargs)
+
+        with PROFILER.stage(func.__name__) as stage:
+            result = func(*args, **kwargs)
+            stage["rows"] = result_rows(result)
+
+        return result
+
+    return wrapper
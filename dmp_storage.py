@@ -0,0 +1,702 @@
+"""
+Storage Backend Module
+
+This module provides a single interface to the database used by the
+Data Pre-processing and the Data Analysis modules, so that the whole
+pipeline can run against a MySQL database server or in-process
+against an embedded SQLite or DuckDB database file.
+
+All queries are written with "%s" placeholders and MySQL column types;
+every backend translates them to its own dialect. The backend is
+selected with STORAGE_BACKEND (or the argument of connect_storage).
+"""
+
+author = "Tanuja Seervi, Bikiran Choudhury"
+
+
+import re
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from getpass import getpass
+from queue import Queue
+from threading import Lock
+from time import monotonic
+
+from dmp_profiling import PROFILER
+
+
+# Backend used by connect_storage(): "mysql", "sqlite" or "duckdb"
+STORAGE_BACKEND = "mysql"
+
+# Name of the MySQL database
+DATABASE_NAME = "olympic"
+
+# Database files of the embedded backends
+DATABASE_FILES = {"sqlite": "olympic.db", "duckdb": "olympic.duckdb"}
+
+# Maximum number of prepared statements kept open per connection
+STATEMENT_CACHE_SIZE = 64
+
+# Maximum number of query results kept by the result cache, their
+# time-to-live in seconds (None: until the data changes) and the
+# seconds between two checks of the data version of the database
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = None
+QUERY_CACHE_CHECK_INTERVAL = 1.0
+
+# Number of connections (and query threads) of a StoragePool
+POOL_SIZE = 4
+
+# Time buckets of date_bucket(): "week" starts on Monday
+RESOLUTIONS = ["day", "week", "month"]
+
+
+# SQLite stores dates as ISO strings
+sqlite3.register_adapter(date, date.isoformat)
+
+
+class QueryCache:
+    """
+    LRU cache of query results keyed by the normalized query and its
+    parameters, valid for one data version of the database. It can be
+    shared by the connections of a StoragePool (thread-safe).
+
+    Input:
+        max_size: int
+            maximum number of results, default QUERY_CACHE_SIZE
+        ttl: float
+            seconds a result stays valid, default QUERY_CACHE_TTL
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or QUERY_CACHE_SIZE
+        self.ttl = QUERY_CACHE_TTL if ttl is None else ttl
+
+        # (time stored, records) by key, least recently used first
+        self.entries = OrderedDict()
+
+        # data version of the cached results and time of its last check
+        self.version = None
+        self.checked_at = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self.lock = Lock()
+
+    @staticmethod
+    def key(query, params):
+        """
+        Return the cache key of a query: whitespace is normalized so that
+        the same query written on several lines shares its results.
+        """
+
+        return " ".join(query.split()), tuple(params)
+
+    def get(self, key):
+        """
+        Return the cached records of the key, or None.
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and self.ttl is not None and monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+            return entry[1]
+
+    def put(self, key, records):
+        with self.lock:
+            self.entries[key] = (monotonic(), records)
+
+            # Evict the least recently used result
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_version(self, version):
+        """
+        Drop all the results when the data version of the database changed.
+        """
+
+        with self.lock:
+            if self.version is not None and version != self.version:
+                self.entries.clear()
+                self.invalidations += 1
+
+            self.version = version
+            self.checked_at = monotonic()
+
+    def stats(self):
+        """
+        Return the hits, misses, hit rate, evictions, invalidations and size.
+        """
+
+        lookups = self.hits + self.misses
+
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations, "results": len(self.entries)}
+
+
+class StorageBackend:
+    """
+    Interface to a database connection.
+
+    The queries use "%s" placeholders for the parameters, which are
+    translated to the placeholder of the backend.
+
+    The SELECT queries run on prepared statements cached per connection
+    and keyed by the query template, so a template is parsed and planned
+    once and then only executed with new parameters. DuckDB has no such
+    statements in its Python client and runs the queries on its connection.
+
+    With enable_result_cache(), the results of the SELECT queries are
+    also cached until the loader bumps the data version of the database.
+
+    Input:
+        connection: DB-API connection object
+    """
+
+    name = None
+    placeholder = "%s"
+
+    # The backend can load a CSV file with "LOAD DATA LOCAL INFILE"
+    supports_load_data = False
+
+    # The backend can insert a whole DataFrame at once, see insert_dataframe()
+    supports_frame_insert = False
+
+    # SQL expressions of the first day of the week/month of a DATE column
+    BUCKET_EXPRESSIONS = {}
+
+    def __init__(self, connection):
+        self.connection = connection
+
+        # prepared statements (cursors) by query template, least recently used first
+        self.statements = OrderedDict()
+        self.statement_hits = 0
+        self.statement_misses = 0
+
+        # QueryCache of the SELECT results, see enable_result_cache()
+        self.result_cache = None
+
+    def translate(self, query):
+        """
+        Return the query with the placeholders of the backend.
+        """
+
+        if self.placeholder == "%s":
+            return query
+
+        return query.replace("%s", self.placeholder)
+
+    def translate_ddl(self, query):
+        """
+        Return the CREATE TABLE query with the column types of the backend.
+        """
+
+        return query
+
+    def prepared_cursor(self):
+        """
+        Return a new cursor which prepares the statements it executes.
+        """
+
+        return self.connection.cursor()
+
+    def prepare(self, query):
+        """
+        Return the cached prepared statement of the query template,
+        preparing it on a miss.
+        """
+
+        query = self.translate(query)
+        cursor = self.statements.get(query)
+
+        if cursor is None:
+            self.statement_misses += 1
+            cursor = self.statements[query] = self.prepared_cursor()
+
+            # Close the least recently used statement
+            if len(self.statements) > STATEMENT_CACHE_SIZE:
+                self.statements.popitem(last=False)[1].close()
+        else:
+            self.statement_hits += 1
+            self.statements.move_to_end(query)
+
+        return query, cursor
+
+    def statement_stats(self):
+        """
+        Return the hits, misses and size of the prepared statement cache.
+        """
+
+        return {"hits": self.statement_hits, "misses": self.statement_misses,
+                "statements": len(self.statements)}
+
+    def run_query(self, query, params=()):
+        """
+        Run a SELECT query on its prepared statement, bypassing the result cache.
+        """
+
+        query, cursor = self.prepare(query)
+
+        with PROFILER.statement(query) as statement:
+            cursor.execute(query, tuple(params))
+            records = cursor.fetchall()
+            statement["rows"] = len(records)
+
+        return records
+
+    def query(self, query, params=()):
+        """
+        Run a SELECT query and return all the records as a list of tuples.
+        """
+
+        cache = self.result_cache
+
+        if cache is None:
+            return self.run_query(query, params)
+
+        # Invalidate the cached results when the database has been reloaded
+        if cache.checked_at is None or monotonic() - cache.checked_at >= QUERY_CACHE_CHECK_INTERVAL:
+            cache.set_version(self.data_version())
+
+        key = cache.key(query, params)
+        records = cache.get(key)
+
+        if records is None:
+            records = self.run_query(query, params)
+            cache.put(key, records)
+
+        return list(records)
+
+    def date_bucket(self, column, resolution):
+        """
+        Return the SQL expression of the first day of the 'resolution'
+        bucket (see RESOLUTIONS) of a DATE column.
+        """
+
+        if resolution not in RESOLUTIONS:
+            raise ValueError("Unknown resolution '{}', expected one of {}".format(resolution, RESOLUTIONS))
+
+        if resolution == "day":
+            return column
+
+        return self.BUCKET_EXPRESSIONS[resolution].format(column)
+
+    def enable_result_cache(self, max_size=None, ttl=None, cache=None):
+        """
+        Cache the results of the SELECT queries (see QueryCache),
+        in the given shared 'cache' or in a new one.
+        """
+
+        self.result_cache = cache or QueryCache(max_size, ttl)
+
+        return self.result_cache
+
+    def data_version(self):
+        """
+        Return the data version of the database, bumped by every load.
+        """
+
+        records = self.run_query("SELECT version FROM data_version")
+
+        return records[0][0] if records else 0
+
+    def bump_data_version(self):
+        """
+        Increment the data version of the database after a load, which
+        invalidates the cached query results of all the connections.
+        """
+
+        if self.run_query("SELECT version FROM data_version"):
+            self.execute("UPDATE data_version SET version = version + 1")
+        else:
+            self.execute("INSERT INTO data_version (version) VALUES (1)")
+
+        self.commit()
+
+        return None
+
+    def execute(self, query, params=()):
+        """
+        Run a query which returns no records.
+        """
+
+        cursor = self.connection.cursor()
+
+        with PROFILER.statement(query) as statement:
+            cursor.execute(self.translate(query), tuple(params))
+            statement["rows"] = max(cursor.rowcount, 0)
+
+        cursor.close()
+
+        return None
+
+    def executemany(self, query, records):
+        """
+        Run a query once for every parameter tuple in 'records'.
+        """
+
+        cursor = self.connection.cursor()
+
+        with PROFILER.statement(query) as statement:
+            cursor.executemany(self.translate(query), records)
+            statement["rows"] = len(records)
+
+        cursor.close()
+
+        return None
+
+    def create_table(self, query):
+        """
+        Run a CREATE TABLE query written for MySQL.
+        """
+
+        return self.execute(self.translate_ddl(query))
+
+    def create_index(self, index_name, table_name, column_names):
+        """
+        Create an index of the table on the given columns, if it does not exist.
+        """
+
+        return self.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".
+                            format(index_name, table_name, ", ".join(column_names)))
+
+    def insert_query(self, table_name, column_names, upsert=False):
+        """
+        Return an INSERT query for the given columns. With 'upsert', a
+        row with the same unique key as an existing row replaces it.
+        """
+
+        return "{} INTO {} ({}) VALUES ({})".format(
+            "INSERT OR REPLACE" if upsert else "INSERT",
+            table_name, ", ".join(column_names), ",".join(["%s"] * len(column_names)))
+
+    def insert_dataframe(self, table_name, column_names, df, upsert=False):
+        """
+        Insert all the rows of a DataFrame (columns in the order of
+        'column_names') with a single statement, on the backends with
+        'supports_frame_insert'.
+        """
+
+        raise NotImplementedError("{} storage has no frame insert".format(self.name))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        for cursor in self.statements.values():
+            cursor.close()
+        self.statements.clear()
+
+        self.connection.close()
+
+    @classmethod
+    def connect_many(cls, size, **kwargs):
+        """
+        Return 'size' storages on separate connections to the same database.
+        """
+
+        return [cls.connect(**kwargs) for _ in range(size)]
+
+
+class MySQLStorage(StorageBackend):
+    """
+    Storage on a MySQL database server (MySQL Connector Python).
+    """
+
+    name = "mysql"
+    supports_load_data = True
+
+    BUCKET_EXPRESSIONS = {"week": "DATE_SUB({0}, INTERVAL WEEKDAY({0}) DAY)",
+                          "month": "DATE_SUB({0}, INTERVAL DAYOFMONTH({0}) - 1 DAY)"}
+
+    @classmethod
+    def connect(cls, allow_local_infile=False, **kwargs):
+        """
+        Connect and login into the MySQL database server, create
+        the database if needed and select it.
+        """
+
+        import mysql.connector
+
+        connection = mysql.connector.connect(user=input("Enter username: "), password=getpass("Enter password: "),
+                                             allow_local_infile=allow_local_infile)
+        storage = cls(connection)
+
+        # Create and select database
+        storage.execute("CREATE DATABASE IF NOT EXISTS {}".format(DATABASE_NAME))
+        storage.execute("use {}".format(DATABASE_NAME))
+
+        return storage
+
+    @classmethod
+    def connect_many(cls, size, **kwargs):
+        """
+        Login once and return 'size' storages on the connections of a
+        MySQL Connector connection pool, with the database selected.
+        """
+
+        from mysql.connector.pooling import MySQLConnectionPool
+
+        pool = MySQLConnectionPool(pool_name=DATABASE_NAME, pool_size=size, user=input("Enter username: "),
+                                   password=getpass("Enter password: "), database=DATABASE_NAME)
+
+        return [cls(pool.get_connection()) for _ in range(size)]
+
+    def insert_query(self, table_name, column_names, upsert=False):
+        insert_query = super().insert_query(table_name, column_names)
+
+        if upsert:
+            insert_query += " ON DUPLICATE KEY UPDATE {}".format(
+                ", ".join("{0}=VALUES({0})".format(col) for col in column_names))
+
+        return insert_query
+
+    def create_index(self, index_name, table_name, column_names):
+        # MySQL has no CREATE INDEX IF NOT EXISTS
+        if self.run_query("SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() \
+                          AND table_name = %s AND index_name = %s", (table_name, index_name)):
+            return None
+
+        return self.execute("CREATE INDEX {} ON {} ({})".format(index_name, table_name, ", ".join(column_names)))
+
+    def prepared_cursor(self):
+        # Server-side prepared statement
+        return self.connection.cursor(prepared=True)
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Storage in an embedded SQLite database file.
+    """
+
+    name = "sqlite"
+    placeholder = "?"
+
+    BUCKET_EXPRESSIONS = {"week": "date({0}, '-' || ((CAST(strftime('%w', {0}) AS INTEGER) + 6) % 7) || ' days')",
+                          "month": "date({0}, 'start of month')"}
+
+    @classmethod
+    def connect(cls, file_path=None, **kwargs):
+        # A pooled connection is used by one thread at a time, not always the same
+        connection = sqlite3.connect(file_path or DATABASE_FILES["sqlite"], check_same_thread=False)
+        connection.execute("PRAGMA foreign_keys = ON")
+
+        return cls(connection)
+
+
+class DuckDBStorage(StorageBackend):
+    """
+    Storage in an embedded DuckDB (columnar) database file.
+    """
+
+    name = "duckdb"
+    placeholder = "?"
+
+    BUCKET_EXPRESSIONS = {"week": "CAST(date_trunc('week', {0}) AS DATE)",
+                          "month": "CAST(date_trunc('month', {0}) AS DATE)"}
+
+    # The DataFrame is scanned in place by an INSERT ... SELECT, which
+    # is orders of magnitude faster than executemany() row by row
+    supports_frame_insert = True
+
+    # MySQL unsigned integer types and their DuckDB names
+    UNSIGNED_TYPES = {"TINYINT": "UTINYINT", "SMALLINT": "USMALLINT", "INT": "UINTEGER", "BIGINT": "UBIGINT"}
+
+    @classmethod
+    def connect(cls, file_path=None, **kwargs):
+        import duckdb
+
+        return cls(duckdb.connect(file_path or DATABASE_FILES["duckdb"]))
+
+    @classmethod
+    def connect_many(cls, size, **kwargs):
+        # One database instance per file: the other connections are its duplicates
+        storage = cls.connect(**kwargs)
+
+        return [storage] + [cls(storage.connection.cursor()) for _ in range(size - 1)]
+
+    def translate_ddl(self, query):
+        return re.sub(r"\b(TINYINT|SMALLINT|INT|BIGINT) UNSIGNED\b",
+                      lambda m: self.UNSIGNED_TYPES[m.group(1)], query)
+
+    def prepare(self, query):
+        # The Python client has no prepared statement API (and SQL EXECUTE
+        # takes no bound parameters): the connection prepares every query
+        # itself, so no duplicate connection (cursor) is opened per template
+        return self.translate(query), self.connection
+
+    def execute(self, query, params=()):
+        with PROFILER.statement(query):
+            self.connection.execute(self.translate(query), tuple(params))
+
+        return None
+
+    def executemany(self, query, records):
+        if len(records):
+            with PROFILER.statement(query) as statement:
+                self.connection.executemany(self.translate(query), records)
+                statement["rows"] = len(records)
+
+        return None
+
+    def insert_dataframe(self, table_name, column_names, df, upsert=False):
+        if not len(df):
+            return None
+
+        insert_query = "INSERT {}INTO {} ({}) SELECT * FROM insert_frame".format(
+            "OR REPLACE " if upsert else "", table_name, ", ".join(column_names))
+
+        # The frame is registered as a view, with the column names of the table
+        self.connection.register("insert_frame", df.set_axis(column_names, axis=1))
+
+        try:
+            with PROFILER.statement(insert_query) as statement:
+                self.connection.execute(insert_query)
+                statement["rows"] = len(df)
+        finally:
+            self.connection.unregister("insert_frame")
+
+        return None
+
+
+STORAGE_BACKENDS = {"mysql": MySQLStorage, "sqlite": SQLiteStorage, "duckdb": DuckDBStorage}
+
+
+class StoragePool:
+    """
+    Pool of storages on separate connections to the same database, with
+    a thread pool running the functions which read from them, so that
+    independent queries run concurrently.
+
+    Input:
+        storages: list[StorageBackend]
+    """
+
+    def __init__(self, storages):
+        self.storages = storages
+        self.executor = ThreadPoolExecutor(max_workers=len(storages))
+        self.result_cache = None
+
+        self.idle = Queue()
+        for storage in storages:
+            self.idle.put(storage)
+
+    @contextmanager
+    def acquire(self):
+        """
+        Lend an idle storage for the duration of the 'with' block.
+        """
+
+        storage = self.idle.get()
+
+        try:
+            yield storage
+        finally:
+            self.idle.put(storage)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Return func(storage, *args, **kwargs) with an idle storage.
+        """
+
+        with self.acquire() as storage:
+            return func(storage, *args, **kwargs)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run func(storage, *args, **kwargs) on the thread pool with an
+        idle storage and return its Future.
+        """
+
+        return self.executor.submit(self.call, func, *args, **kwargs)
+
+    def query(self, query, params=()):
+        """
+        Run a SELECT query on an idle storage.
+        """
+
+        with self.acquire() as storage:
+            return storage.query(query, params)
+
+    def enable_result_cache(self, max_size=None, ttl=None):
+        """
+        Cache the query results of all the storages in one shared QueryCache.
+        """
+
+        self.result_cache = QueryCache(max_size, ttl)
+
+        for storage in self.storages:
+            storage.enable_result_cache(cache=self.result_cache)
+
+        return self.result_cache
+
+    def statement_stats(self):
+        """
+        Return the prepared statement cache stats summed over the storages.
+        """
+
+        stats = [storage.statement_stats() for storage in self.storages]
+
+        return {key: sum(stat[key] for stat in stats) for key in stats[0]}
+
+    def close(self):
+        self.executor.shutdown()
+
+        for storage in self.storages:
+            storage.close()
+
+
+def connect_storage(backend=None, **kwargs):
+    """
+    This function connects to the database of the given backend.
+
+    Input:
+        backend: string
+            "mysql", "sqlite" or "duckdb", default STORAGE_BACKEND
+        kwargs:
+            file_path: database file of the embedded backends
+            allow_local_infile: enable "LOAD DATA LOCAL INFILE" (MySQL)
+
+    Return:
+        StorageBackend
+    """
+
+    return STORAGE_BACKENDS[backend or STORAGE_BACKEND].connect(**kwargs)
+
+
+def connect_storage_pool(backend=None, size=None, **kwargs):
+    """
+    This function opens a pool of connections to the database of the
+    given backend (see connect_storage()).
+
+    Input:
+        backend: string
+            "mysql", "sqlite" or "duckdb", default STORAGE_BACKEND
+        size: int
+            number of connections, default POOL_SIZE
+        kwargs:
+            see connect_storage()
+
+    Return:
+        StoragePool
+    """
+
+    return StoragePool(STORAGE_BACKENDS[backend or STORAGE_BACKEND].connect_many(size or POOL_SIZE, **kwargs))